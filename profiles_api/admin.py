@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User
+from .models import Feed, User
 
 
 @admin.register(User)
@@ -7,3 +7,14 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ("email", "name", "is_active", "is_staff")
     list_filter = ("is_active", "is_staff")
     search_fields = ("email", "name")
+
+
+@admin.register(Feed)
+class FeedAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "user", "likes_count", "created_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    # Likes are managed through the API so likes_count stays in step.
+    exclude = ("likes",)
+    readonly_fields = ("likes_count",)
+    search_fields = ("text", "user__email")
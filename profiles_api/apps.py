@@ -8,3 +8,6 @@ class ProfilesApiConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "profiles_api"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401  pylint: disable=unused-import,import-outside-toplevel
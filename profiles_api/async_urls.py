@@ -0,0 +1,20 @@
+"""URL patterns serving the async views; same paths and names as urls.py."""
+
+from django.urls import path
+
+from .async_views import AsyncFeedAPIView, AsyncFeedLikeAPIView, AsyncUserAPIView
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    "profile-method": AsyncUserAPIView,
+    "profile-details": AsyncUserAPIView,
+    "feeds": AsyncFeedAPIView,
+    "feed-like": AsyncFeedLikeAPIView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if pattern.name in ASYNC_VIEWS
+    else pattern
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,316 @@
+"""
+ASGI-native versions of the feed and profile endpoints.
+
+These mirror the views in ``views.py`` response for response, but run as
+coroutines: authentication uses ``SimpleJWTAuthentication.aauthenticate`` and
+reads use the async ORM (``aget``, ``async for``). Work that needs a database
+transaction or a DRF serializer write (like toggles, creates, updates) is not
+available through the async ORM and is handed to ``sync_to_async`` as a single
+call. Enable them with ``ASYNC_API = True`` (see ``profiles_project/urls.py``).
+
+``EventStreamView`` has no sync counterpart and is routed under both URL
+configurations.
+"""
+
+import json
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    NotAuthenticated,
+    ParseError,
+    ValidationError,
+)
+
+from . import conditional, images, multiget, timeline
+from .authentication import QueryTokenJWTAuthentication, SimpleJWTAuthentication
+from .events import get_broadcaster
+from .feed_cache import build_feed_page, feed_page_cache, page_variant
+from .likes import aliked_feed_ids, mark_liked_by_me, toggle_like
+from .like_buffer import like_buffer
+from .models import Feed, User
+from .pagination import FeedCursorPagination
+from .read_serializers import feed_reader, project, trim, user_reader
+from .search import search_users
+from .serializers import FeedSerializer, UserSerializer
+from .streaming import astream_queryset, wants_stream
+
+
+def _error(message, status_code):
+    return JsonResponse({"error": message}, status=status_code)
+
+
+def _exception_response(exc, status_code=None):
+    """
+    ``exc`` rendered the way DRF's ``exception_handler`` renders it: list and
+    dict details (validation errors) as they are, anything else under
+    ``"detail"``.
+    """
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    return JsonResponse(data, status=status_code or exc.status_code, safe=False)
+
+
+def _request_data(request):
+    """The request body as DRF would see it: JSON, or form fields plus files."""
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
+    data = request.POST.copy()
+    data.update(request.FILES)
+    return data
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of ``APIView``: bearer-token authentication,
+    an authenticated-by-default permission check and JSON errors.
+    """
+
+    authenticator = SimpleJWTAuthentication()
+    # HTTP methods that may be called without credentials.
+    anonymous_methods = ()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None)
+        if method not in self.http_method_names or handler is None:
+            return self.http_method_not_allowed(request, *args, **kwargs)
+
+        try:
+            auth = await self.authenticator.aauthenticate(request)
+        except APIException as exc:
+            # DRF answers 403 here too: the backend sets no WWW-Authenticate.
+            return _exception_response(exc, status.HTTP_403_FORBIDDEN)
+        request.user = auth[0] if auth else AnonymousUser()
+
+        if method not in self.anonymous_methods and not request.user.is_authenticated:
+            return _exception_response(NotAuthenticated(), status.HTTP_403_FORBIDDEN)
+
+        try:
+            return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            return _exception_response(exc)
+
+
+class AsyncUserAPIView(AsyncAPIView):
+    """Async version of ``UserRegisterAPIView``."""
+
+    anonymous_methods = ("post",)
+
+    async def get(self, request, pk=None):
+        search_query = request.GET.get("search")
+
+        if pk:
+            row = await user_reader.values(User.objects.filter(pk=pk)).afirst()
+            if row is None:
+                return _error("User not found", status.HTTP_404_NOT_FOUND)
+            etag = conditional.row_etag(request, row)
+            cached = conditional.not_modified(request, etag)
+            if cached is not None:
+                return cached
+            response = JsonResponse(user_reader.to_representation(row))
+            return conditional.add_validators(response, etag)
+
+        if "ids" in request.GET:
+            try:
+                ids = multiget.parse_ids(request.GET["ids"])
+            except ValueError as exc:
+                return _error(str(exc), status.HTTP_400_BAD_REQUEST)
+            reader, _ = project(request, user_reader)
+            rows = [row async for row in multiget.users_by_ids(ids, reader)]
+            rows = multiget.in_request_order(rows, ids)
+            etag = conditional.rows_etag(request, rows)
+            cached = conditional.not_modified(request, etag)
+            if cached is not None:
+                return cached
+            response = JsonResponse(reader.many(rows), safe=False)
+            return conditional.add_validators(response, etag)
+
+        if search_query:
+            try:
+                limit = int(request.GET.get("limit", settings.USER_SEARCH_LIMIT))
+            except ValueError:
+                limit = settings.USER_SEARCH_LIMIT
+            limit = max(1, min(limit, settings.USER_SEARCH_MAX_LIMIT))
+            _, fields = project(request, user_reader)
+            users = await sync_to_async(search_users)(search_query, limit)
+            data = trim(UserSerializer(users, many=True).data, fields)
+            return JsonResponse(data, safe=False)
+
+        if wants_stream(request):
+            reader, _ = project(request, user_reader)
+            users = reader.values(User.objects.order_by("pk"))
+            return astream_queryset(request, users, reader)
+
+        reader, _ = project(request, user_reader)
+        users = reader.values(User.objects.all())
+        data = [reader.to_representation(row) async for row in users]
+        return JsonResponse(data, safe=False)
+
+    async def post(self, request):
+        return await sync_to_async(self._save)(
+            UserSerializer(data=_request_data(request)),
+            "User created successfully!",
+            status.HTTP_201_CREATED,
+        )
+
+    async def put(self, request, pk):
+        return await self._update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self._update(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        try:
+            user = await User.objects.aget(pk=pk)
+        except User.DoesNotExist:
+            return _error("User not found", status.HTTP_404_NOT_FOUND)
+        await user.adelete()
+        return JsonResponse({"message": "User deleted successfully!"})
+
+    async def _update(self, request, pk, partial):
+        try:
+            user = await User.objects.aget(pk=pk)
+        except User.DoesNotExist:
+            return _error("User not found", status.HTTP_404_NOT_FOUND)
+
+        if request.user.id != user.id:
+            return _error(
+                "You are not allowed to edit other users.", status.HTTP_403_FORBIDDEN
+            )
+
+        message = "User partially updated!" if partial else "User fully updated!"
+        serializer = UserSerializer(user, data=_request_data(request), partial=partial)
+        return await sync_to_async(self._save)(serializer, message, status.HTTP_200_OK)
+
+    @staticmethod
+    def _save(serializer, message, status_code):
+        if serializer.is_valid():
+            try:
+                serializer.save()
+            except ValidationError as exc:
+                return _exception_response(exc)
+            return JsonResponse(
+                {"message": message, "data": serializer.data}, status=status_code
+            )
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncFeedAPIView(AsyncAPIView):
+    """Async version of ``FeedAPIView``."""
+
+    pagination_class = FeedCursorPagination
+
+    async def get(self, request):
+        if wants_stream(request):
+            reader, _ = project(request, feed_reader)
+            feeds = reader.values(Feed.objects.all())
+            return astream_queryset(request, feeds, reader)
+
+        paginator = self.pagination_class()
+        reader, fields = project(
+            request, feed_reader, extra=["liked_by_me"], required=["id"]
+        )
+        feeds = reader.values(Feed.objects.all(), "created_at")
+        # Only a rebuild, which paginates with the sync ORM, hops to a thread.
+        variant = page_variant(paginator, request, reader)
+        page = await feed_page_cache.alookup(variant)
+        if page is None:
+            page = await sync_to_async(feed_page_cache.fetch)(
+                variant, lambda: build_feed_page(paginator, feeds, request, self, reader)
+            )
+
+        # Likes still waiting in the write-behind buffer are added on top, then
+        # the caller's own likes for the page in one IN query.
+        results = like_buffer.overlay(page["results"])
+        if fields is None or "liked_by_me" in fields:
+            feed_ids = [row["id"] for row in results]
+            results = mark_liked_by_me(
+                results, await aliked_feed_ids(request.user, feed_ids)
+            )
+        results = trim(results, fields)
+
+        etag = conditional.feed_page_etag(request, results, page["next_cursor"])
+        cached = conditional.not_modified(request, etag)
+        if cached is not None:
+            return cached
+        paginator.restore(request, page["next_cursor"])
+        response = JsonResponse(paginator.get_paginated_data(results))
+        return conditional.add_validators(response, etag)
+
+    async def post(self, request):
+        if request.user.role != "teacher":
+            return _error("Only teachers can create feeds.", status.HTTP_403_FORBIDDEN)
+        return await sync_to_async(self._create)(request.user, _request_data(request))
+
+    @staticmethod
+    def _create(user, data):
+        serializer = FeedSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        feed = serializer.save(user=user)
+        if feed.image:
+            images.enqueue(feed)
+        transaction.on_commit(partial(timeline.fan_out, feed))
+        get_broadcaster().feed_created(serializer.data)
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncFeedLikeAPIView(AsyncAPIView):
+    """Async version of ``FeedLikeAPIView``."""
+
+    async def post(self, request, pk):
+        if request.user.role != "student":
+            return _error("Only students can like feeds.", status.HTTP_403_FORBIDDEN)
+
+        # toggle_like needs a transaction, which the async ORM cannot open.
+        try:
+            liked, likes_count = await sync_to_async(toggle_like)(pk, request.user.id)
+        except Feed.DoesNotExist:
+            return _error("Feed not found", status.HTTP_404_NOT_FOUND)
+        get_broadcaster().likes_changed(pk, likes_count)
+
+        message = "Feed liked" if liked else "Feed unliked"
+        return JsonResponse({"message": message, "likes_count": likes_count})
+
+
+class EventStreamView(AsyncAPIView):
+    """Server-sent events for new posts and like counts; see ``events``."""
+
+    authenticator = QueryTokenJWTAuthentication()
+
+    async def get(self, request):
+        last_event_id = request.headers.get("Last-Event-ID")
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(
+                get_broadcaster().stream(last_event_id),
+                content_type="text/event-stream",
+            )
+        else:
+            # WSGI would drain the endless stream before sending a byte, so
+            # answer at once with what is pending and let the client reconnect.
+            stream = get_broadcaster().stream(last_event_id, once=True)
+            chunks = [chunk async for chunk in stream]
+            response = HttpResponse(chunks, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
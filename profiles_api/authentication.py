@@ -2,6 +2,10 @@
 
 # pylint: disable=no-member
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, Tuple
 
 import jwt
@@ -10,7 +14,109 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework.authentication import BaseAuthentication
 
+from . import routing
+from .conf import app_settings
 from .models import User
+from .principals import principal_cache
+
+
+DEFAULTS = {
+    "MAX_SIZE": 4096,
+    "POLICY": "lru",
+}
+
+conf = app_settings("JWT_TOKEN_MEMO", DEFAULTS)
+
+
+class VerifiedTokenMemo:
+    """
+    Bounded memo of JWTs that already passed signature verification.
+
+    Entries are keyed on the SHA-256 digest of the raw token and hold the
+    decoded payload plus its ``exp``; a hit past ``exp`` is discarded, so the
+    memo never extends a token's lifetime. Only successful decodes are stored.
+    ``policy`` is ``"lru"`` (hits refresh recency) or ``"fifo"``.
+    """
+
+    POLICIES = ("lru", "fifo")
+
+    def __init__(self, max_size=4096, policy="lru"):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.configure(max_size, policy)
+
+    def configure(self, max_size, policy):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy!r}")
+        self.max_size = max_size
+        self.policy = policy
+        self.clear()
+
+    @classmethod
+    def from_settings(cls):
+        memo = cls()
+        memo.load_settings()
+        return memo
+
+    def load_settings(self):
+        """(Re)read ``JWT_TOKEN_MEMO``, starting from an empty memo."""
+        self.configure(conf("MAX_SIZE"), conf("POLICY"))
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Return the memoized payload for ``token``, or ``None``."""
+        if self.max_size <= 0:
+            return None
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, token, payload):
+        exp = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (payload, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "policy": self.policy,
+            }
+
+
+token_memo = VerifiedTokenMemo.from_settings()
+conf.on_change(token_memo.load_settings)
 
 
 class SimpleJWTAuthentication(BaseAuthentication):
@@ -22,6 +128,36 @@ class SimpleJWTAuthentication(BaseAuthentication):
     keyword = "Bearer"
 
     def authenticate(self, request) -> Optional[Tuple[User, str]]:
+        token = self.get_token(request)
+        if token is None:
+            return None
+
+        user_id = self.get_user_id(token)
+        routing.identify(user_id)
+        try:
+            user = principal_cache.get_user(user_id)
+        except User.DoesNotExist as exc:
+            raise exceptions.AuthenticationFailed(_("User not found.")) from exc
+
+        return user, token
+
+    async def aauthenticate(self, request) -> Optional[Tuple[User, str]]:
+        """``authenticate`` for async views; the user lookup never blocks."""
+        token = self.get_token(request)
+        if token is None:
+            return None
+
+        user_id = self.get_user_id(token)
+        await routing.aidentify(user_id)
+        try:
+            user = await principal_cache.aget_user(user_id)
+        except User.DoesNotExist as exc:
+            raise exceptions.AuthenticationFailed(_("User not found.")) from exc
+
+        return user, token
+
+    def get_token(self, request) -> Optional[str]:
+        """Return the bearer token from ``request``, or ``None`` if absent."""
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return None
@@ -35,6 +171,21 @@ class SimpleJWTAuthentication(BaseAuthentication):
         keyword, token = parts
         if keyword.lower() != self.keyword.lower():
             return None
+        return token
+
+    def get_user_id(self, token):
+        payload = self.decode_token(token)
+
+        user_id = payload.get("user_id")
+        if not user_id:
+            raise exceptions.AuthenticationFailed(_("Token contained no user id."))
+        return user_id
+
+    def decode_token(self, token) -> dict:
+        """Verify ``token`` and return its payload, consulting ``token_memo``."""
+        payload = token_memo.get(token)
+        if payload is not None:
+            return payload
 
         try:
             payload = jwt.decode(
@@ -48,13 +199,21 @@ class SimpleJWTAuthentication(BaseAuthentication):
         except jwt.InvalidTokenError as exc:
             raise exceptions.AuthenticationFailed(_("Invalid token.")) from exc
 
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise exceptions.AuthenticationFailed(_("Token contained no user id."))
+        token_memo.put(token, payload)
+        return payload
 
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist as exc:
-            raise exceptions.AuthenticationFailed(_("User not found.")) from exc
 
-        return user, token
+class QueryTokenJWTAuthentication(SimpleJWTAuthentication):
+    """
+    ``SimpleJWTAuthentication`` that also takes the token from ``?token=``,
+    for the browser ``EventSource`` API, which cannot send headers. Only use
+    it where that is needed: URLs end up in access logs and browser history.
+    """
+
+    query_param = "token"
+
+    def get_token(self, request) -> Optional[str]:
+        token = super().get_token(request)
+        if token is None and "Authorization" not in request.headers:
+            token = request.GET.get(self.query_param) or None
+        return token
@@ -0,0 +1,270 @@
+"""
+Building blocks for ``manage.py seed_benchmark_data`` and ``manage.py benchmark``.
+
+``seed`` creates a synthetic dataset whose like graph follows a power law (a
+few viral posts, a long tail of quiet ones). ``SCENARIOS`` describe the
+requests to drive, ``summarize`` turns latency samples into the figures we
+track, ``combine`` takes their median over repeated runs, and ``compare``
+flags regressions against a saved JSON baseline.
+"""
+
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Feed, User
+
+BENCH_DOMAIN = "bench.example.invalid"
+BENCH_PASSWORD = "bench12"
+# Pareto shape for post popularity and teacher activity; lower is more skewed.
+POWER_LAW_ALPHA = 1.2
+LATENCY_PERCENTILES = {"p50_ms": 0.50, "p95_ms": 0.95, "p99_ms": 0.99}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def issue_token(user_id, email):
+    """A bearer token like the one ``UserLoginAPIView`` hands out."""
+    payload = {
+        "user_id": user_id,
+        "email": email,
+        "exp": datetime.utcnow() + timedelta(hours=2),
+        "iat": datetime.utcnow(),
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+
+
+def clear():
+    """Delete every seeded user (their feeds and likes cascade)."""
+    return User.objects.filter(email__endswith=f"@{BENCH_DOMAIN}").delete()[0]
+
+
+def seed(students=1000, teachers=50, feeds=2000, likes=20000, rng=None):
+    """
+    Create ``students`` + ``teachers`` users, ``feeds`` posts spread over the
+    teachers and up to ``likes`` likes. Both the posts per teacher and the
+    likes per post are drawn from a Pareto distribution. All users share
+    ``BENCH_PASSWORD``, hashed once.
+    """
+    rng = rng or random.Random(0)
+    Like = Feed.likes.through
+    encoded = make_password(BENCH_PASSWORD)
+
+    def make_users(role, count):
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f"{role}{i}@{BENCH_DOMAIN}",
+                    name=f"Bench {role.title()} {i}",
+                    role=role,
+                    password=encoded,
+                )
+                for i in range(count)
+            ),
+            batch_size=1000,
+        )
+        return list(
+            User.objects.filter(
+                email__endswith=f"@{BENCH_DOMAIN}", role=role
+            ).values_list("pk", flat=True)
+        )
+
+    with transaction.atomic():
+        teacher_ids = make_users("teacher", teachers)
+        student_ids = make_users("student", students)
+
+        activity = [rng.paretovariate(POWER_LAW_ALPHA) for _ in teacher_ids]
+        authors = rng.choices(teacher_ids, weights=activity, k=feeds)
+        Feed.objects.bulk_create(
+            (
+                Feed(user_id=author, text=f"benchmark post {i}")
+                for i, author in enumerate(authors)
+            ),
+            batch_size=1000,
+        )
+        feed_ids = list(
+            Feed.objects.filter(user_id__in=teacher_ids).values_list("pk", flat=True)
+        )
+
+        popularity = [rng.paretovariate(POWER_LAW_ALPHA) for _ in feed_ids]
+        pairs = set(
+            zip(
+                rng.choices(feed_ids, weights=popularity, k=likes),
+                rng.choices(student_ids, k=likes),
+            )
+        )
+        Like.objects.bulk_create(
+            (Like(feed_id=feed_id, user_id=user_id) for feed_id, user_id in pairs),
+            batch_size=1000,
+        )
+
+        counts = {}
+        for feed_id, _ in pairs:
+            counts[feed_id] = counts.get(feed_id, 0) + 1
+        Feed.objects.bulk_update(
+            [Feed(pk=pk, likes_count=count) for pk, count in counts.items()],
+            ["likes_count"],
+            batch_size=1000,
+        )
+
+    return {
+        "students": len(student_ids),
+        "teachers": len(teacher_ids),
+        "feeds": len(feed_ids),
+        "likes": len(pairs),
+    }
+
+
+class Dataset:
+    """Ids, tokens and the popularity skew needed to generate requests."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        users = list(
+            User.objects.filter(email__endswith=f"@{BENCH_DOMAIN}").values_list(
+                "pk", "email", "role"
+            )
+        )
+        if not users:
+            raise LookupError("No benchmark users; run manage.py seed_benchmark_data.")
+        self.users = users
+        self.students = [user for user in users if user[2] == "student"]
+        feeds = list(
+            Feed.objects.filter(user__email__endswith=f"@{BENCH_DOMAIN}").values_list(
+                "pk", "likes_count"
+            )
+        )
+        self.feed_ids = [pk for pk, _ in feeds]
+        # Like traffic follows the existing skew: popular posts get more.
+        self.feed_weights = [count + 1 for _, count in feeds]
+        self._tokens = {}
+
+    def token(self, user):
+        if user[0] not in self._tokens:
+            self._tokens[user[0]] = issue_token(user[0], user[1])
+        return self._tokens[user[0]]
+
+    def any_user(self):
+        return self.rng.choice(self.users)
+
+    def student(self):
+        return self.rng.choice(self.students)
+
+    def hot_feed(self):
+        return self.rng.choices(self.feed_ids, weights=self.feed_weights)[0]
+
+
+# Each scenario turns the dataset into (method, path, json_body, token).
+SCENARIOS = {
+    "login": lambda data: (
+        "POST",
+        "/api/login/",
+        {"email": data.any_user()[1], "password": BENCH_PASSWORD},
+        None,
+    ),
+    "feeds": lambda data: ("GET", "/api/feeds/", None, data.token(data.any_user())),
+    "like": lambda data: (
+        "POST",
+        f"/api/feeds/{data.hot_feed()}/like/",
+        None,
+        data.token(data.student()),
+    ),
+    "profile": lambda data: (
+        "GET",
+        f"/api/profile/{data.any_user()[0]}/",
+        None,
+        data.token(data.any_user()),
+    ),
+}
+
+
+def summarize(samples, elapsed):
+    """``samples`` are ``(seconds, ok, queries)``; queries may be ``None``."""
+    latencies = sorted(duration for duration, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        "runs": 1,
+        "requests": len(samples),
+        "errors": sum(1 for _, ok, _ in samples if not ok),
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "queries_per_request": statistics.fmean(queries) if queries else None,
+    }
+
+
+def combine(runs):
+    """
+    The median of each ``summarize`` figure over repeated runs of a scenario,
+    so one noisy run cannot move the result. ``requests`` stays per run, the
+    sample size behind each percentile; ``errors`` is the total.
+    """
+    combined = {
+        metric: statistics.median(run[metric] for run in runs)
+        for metric in ("rps", "mean_ms", *LATENCY_PERCENTILES)
+    }
+    queries = [
+        run["queries_per_request"]
+        for run in runs
+        if run["queries_per_request"] is not None
+    ]
+    combined.update(
+        runs=sum(run.get("runs", 1) for run in runs),
+        requests=min(run["requests"] for run in runs),
+        errors=sum(run["errors"] for run in runs),
+        queries_per_request=statistics.median(queries) if queries else None,
+    )
+    return combined
+
+
+def compare(baseline, current, threshold=0.15, min_delta_ms=2.0, min_tail_samples=30):
+    """
+    Return ``(scenario, metric, baseline, current)`` for every regression:
+    latency percentiles up by more than ``threshold`` *and* ``min_delta_ms``,
+    throughput down by more than ``threshold``, or any increase in queries per
+    request or errors.
+
+    A percentile is only compared when each run had at least
+    ``min_tail_samples`` requests above it; at the defaults p95 needs 600
+    requests per run and p99 3000. Fewer samples leave the tail to a handful of
+    outliers (GC pauses, scheduler hiccups) that differ between runs of the
+    same code.
+    """
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        samples = min(before["requests"], now["requests"])
+        for metric, fraction in LATENCY_PERCENTILES.items():
+            if round(samples * (1 - fraction)) < min_tail_samples:
+                continue
+            allowed = max(before[metric] * threshold, min_delta_ms)
+            if now[metric] - before[metric] > allowed:
+                regressions.append((name, metric, before[metric], now[metric]))
+        if now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append((name, "rps", before["rps"], now["rps"]))
+        queries_before = before.get("queries_per_request")
+        queries_now = now.get("queries_per_request")
+        if (
+            None not in (queries_before, queries_now)
+            and queries_now > queries_before + 0.01
+        ):
+            regressions.append(
+                (name, "queries_per_request", queries_before, queries_now)
+            )
+        if now["errors"] > before["errors"]:
+            regressions.append((name, "errors", before["errors"], now["errors"]))
+    return regressions
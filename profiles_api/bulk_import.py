@@ -0,0 +1,217 @@
+"""
+Bulk user import from CSV or NDJSON.
+
+Rows are handled in batches: each batch is validated field by field without
+touching the database, checked for existing emails with a single ``IN`` query,
+hashed in parallel on a worker pool, and written with ``bulk_create`` inside
+its own transaction. Bad rows are reported by line number and skipped; the rest
+of the batch still goes in.
+
+``manage.py import_users`` hashes on a process pool, one worker per CPU by
+default. The API endpoint runs inside a web worker, so it hashes on a few
+threads instead (``API_HASH_WORKERS``); PBKDF2 releases the GIL.
+"""
+
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from rest_framework import serializers
+
+from .conf import app_settings
+from .models import User
+from .serializers import EMAIL_TAKEN, UserSerializer
+
+DEFAULTS = {
+    "BATCH_SIZE": 1000,
+    "HASH_WORKERS": None,
+    "API_MAX_ROWS": 10000,
+    "API_HASH_WORKERS": 2,
+}
+
+
+conf = app_settings("BULK_IMPORT", DEFAULTS)
+
+
+def parse_rows(stream, fmt):
+    """Yield ``(line_number, row_dict)`` from a CSV or NDJSON text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt!r}")
+
+
+def text_stream(fileobj, encoding="utf-8-sig"):
+    """Wrap an uploaded (binary) file so ``parse_rows`` can read text lines."""
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+
+
+def detect_format(name="", content_type=""):
+    """``"csv"`` or ``"ndjson"`` from a file name or content type, else None."""
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in (
+        "application/x-ndjson",
+        "application/jsonl",
+    ):
+        return "ndjson"
+    return None
+
+
+def _init_hash_worker():
+    # Spawned (non-forked) workers start without Django configured.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "profiles_project.settings")
+    import django  # pylint: disable=import-outside-toplevel
+
+    django.setup()
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "failed": len(self.errors),
+            "errors": self.errors,
+        }
+
+
+class UserImporter:
+    """
+    Runs the batched pipeline; use as a context manager to own the pool.
+    ``threads`` hashes on threads instead of processes.
+    """
+
+    def __init__(self, batch_size=None, workers=None, threads=False):
+        self.batch_size = batch_size or conf("BATCH_SIZE")
+        workers = conf("HASH_WORKERS") if workers is None else workers
+        self.workers = os.cpu_count() if workers is None else workers
+        self.threads = threads
+        self.pool = None
+        self.report = ImportReport()
+        self.seen_emails = set()
+        # One serializer validates every row: building a ModelSerializer's
+        # fields costs more than validating a row with them.
+        self.validator = UserSerializer()
+
+    def __enter__(self):
+        if self.workers > 1 and self.threads:
+            self.pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="import-hash"
+            )
+        elif self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_hash_worker
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def run(self, rows):
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.report
+
+    def _hash(self, passwords):
+        if self.pool is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(make_password, passwords, chunksize=chunksize))
+
+    def _validate(self, batch):
+        valid = []
+        for line, row in batch:
+            if row is None:
+                self.report.add_error(line, {"non_field_errors": ["Malformed row."]})
+                continue
+            try:
+                data = self.validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                self.report.add_error(line, serializers.as_serializer_error(exc))
+                continue
+            key = data["email"].lower()
+            if key in self.seen_emails:
+                self.report.add_error(
+                    line, {"email": ["Duplicate email in import file."]}
+                )
+                continue
+            self.seen_emails.add(key)
+            valid.append((line, data))
+        return valid
+
+    def _import_batch(self, batch):
+        valid = self._validate(batch)
+        if not valid:
+            return
+
+        existing = {
+            email.lower()
+            for email in User.objects.with_emails(
+                data["email"] for _, data in valid
+            ).values_list("email", flat=True)
+        }
+        pending = []
+        for line, data in valid:
+            if data["email"].lower() in existing:
+                self.report.add_error(line, {"email": [EMAIL_TAKEN]})
+            else:
+                pending.append((line, data))
+        if not pending:
+            return
+
+        hashes = self._hash([data.pop("password") for _, data in pending])
+        users = [
+            User(password=encoded, **data)
+            for (_, data), encoded in zip(pending, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            self.report.created += len(users)
+        except IntegrityError:
+            # Someone registered one of these emails since the check; retry
+            # row by row so only the conflicting rows fail.
+            for (line, _), user in zip(pending, users):
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    self.report.created += 1
+                except IntegrityError:
+                    self.report.add_error(line, {"email": [EMAIL_TAKEN]})
+
+
+def import_users(rows, batch_size=None, workers=None, threads=False):
+    """Import ``(line, row)`` pairs and return an ``ImportReport``."""
+    importer = UserImporter(batch_size=batch_size, workers=workers, threads=threads)
+    with importer:
+        return importer.run(rows)
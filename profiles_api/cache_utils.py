@@ -0,0 +1,25 @@
+"""Helpers shared by the modules that keep counters in a Django cache."""
+
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def incr_or_seed(cache, key, seed=None):
+    """
+    ``cache.incr(key)``, creating the counter first if it is missing.
+
+    A missing counter is seeded from the clock (``time.time_ns()`` unless
+    ``seed`` is given), not from zero, so a counter that was evicted never
+    comes back at a value it already had. Returns the incremented value.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns() if seed is None else seed, None)
+        return cache.incr(key)
+
+
+def is_process_local(cache):
+    """True for caches that each worker process keeps to itself."""
+    return isinstance(cache, LocMemCache)
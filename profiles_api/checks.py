@@ -0,0 +1,26 @@
+"""System checks for settings that only go wrong once there are several workers."""
+
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+
+from .cache_utils import is_process_local
+from .throttling import conf as throttle_conf
+
+
+@register(Tags.caches, deploy=True)
+def check_login_throttle_cache(app_configs, **kwargs):
+    """The login throttle must keep its buckets in a cache every worker sees."""
+    alias = throttle_conf("CACHE_ALIAS")
+    if not is_process_local(caches[alias]):
+        return []
+    return [
+        Warning(
+            f"LOGIN_THROTTLE['CACHE_ALIAS'] ({alias!r}) is local to each process.",
+            hint=(
+                "Every worker keeps its own token buckets, so the effective "
+                "login rate limit is RATE times the number of workers. Point "
+                "CACHE_ALIAS at a cache shared by all workers (e.g. Redis)."
+            ),
+            id="profiles_api.W001",
+        )
+    ]
@@ -0,0 +1,77 @@
+"""
+Conditional GET support for the polled read endpoints.
+
+Validators of single rows and id lists are computed from cheap queries, never
+from the rendered body, so ``If-None-Match`` requests that match are answered
+with 304 before any serialization runs.
+
+A feed list page is validated by its own content instead (``feed_page_etag``):
+the page's rows with the buffered likes and the caller's ``liked_by_me``
+applied, plus where the next page starts. Those are needed for the response
+anyway, and reading them costs the indexed page query (nothing with the page
+cache) and the caller's likes on that page. A validator for the whole table
+would cost a ``COUNT(*)`` scan on every request. Streamed lists read the whole
+table and are not revalidated.
+
+No ``Last-Modified`` is sent: no single timestamp moves when a post is deleted,
+so ``If-Modified-Since`` would keep answering 304 for a page that still shows
+it.
+"""
+
+import hashlib
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
+
+from .streaming import wants_ndjson
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(digest)
+
+
+def _variant(request):
+    """What besides the data shapes the body: the URL and the negotiated format."""
+    renderer = getattr(request, "accepted_renderer", None)
+    if renderer is None:
+        # The async views skip content negotiation; only NDJSON is distinct.
+        return request.get_full_path(), "ndjson" if wants_ndjson(request) else None
+    return request.get_full_path(), renderer.format
+
+
+def row_etag(request, row):
+    """ETag of a single ``.values()`` row that is the whole response body."""
+    return make_etag(sorted(row.items()), *_variant(request))
+
+
+def rows_etag(request, rows):
+    """``row_etag`` for a body that is a list of ``.values()`` rows."""
+    return make_etag([sorted(row.items()) for row in rows], *_variant(request))
+
+
+def feed_page_etag(request, rows, next_cursor):
+    """ETag of a feed page's rows, as sent to this caller, and its next cursor."""
+    return make_etag(
+        [sorted(row.items()) for row in rows], next_cursor, *_variant(request)
+    )
+
+
+def add_validators(response, etag):
+    response["ETag"] = etag
+    # Responses are per-user; clients may keep them but must revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def not_modified(request, etag):
+    """A 304 response if ``If-None-Match`` still matches, else ``None``."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_validators(response, etag)
+    return response
@@ -0,0 +1,45 @@
+"""Settings dicts of the profiles API app, merged over their defaults."""
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+
+class AppSettings:
+    """
+    ``conf(name)`` lookups in ``settings.<setting>``, falling back to
+    ``defaults``. The dicts are merged once, on first use, and again only
+    after the setting changes (``override_settings``). Objects built from the
+    settings register with ``on_change`` to be rebuilt then too.
+    """
+
+    def __init__(self, setting, defaults):
+        self.setting = setting
+        self.defaults = defaults
+        self._merged = None
+        self._listeners = []
+        setting_changed.connect(self._setting_changed)
+
+    def _setting_changed(self, setting, **kwargs):
+        if setting == self.setting:
+            self._merged = None
+            for listener in self._listeners:
+                listener()
+
+    def on_change(self, listener):
+        """Call ``listener()`` whenever the setting changes; returns it."""
+        self._listeners.append(listener)
+        return listener
+
+    def __call__(self, name):
+        merged = self._merged
+        if merged is None:
+            merged = self._merged = {
+                **self.defaults,
+                **getattr(settings, self.setting, {}),
+            }
+        return merged[name]
+
+
+def app_settings(setting, defaults):
+    """Return the ``conf(name)`` lookup for ``settings.<setting>``."""
+    return AppSettings(setting, defaults)
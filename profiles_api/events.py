@@ -0,0 +1,312 @@
+"""
+Server-sent events for feed changes, so clients can stop polling the list.
+
+``GET /api/events/`` streams two event types:
+
+* ``feed.created``: the new post, rendered like ``FeedSerializer``;
+* ``feed.likes_changed``: ``{"feeds": [{"id": ..., "likes_count": ...}]}``.
+  Like toggles are coalesced per feed and sent at most once every
+  ``LIKES_INTERVAL`` seconds.
+
+Every event gets an increasing id, and the last ``HISTORY`` events are kept. A
+client that reconnects with ``Last-Event-ID`` is sent what it missed. If the
+missed events are no longer kept, it gets a ``stream.reset`` event and should
+refetch the list. Idle streams get a comment line every ``HEARTBEAT`` seconds,
+so proxies keep them open.
+
+Streams are meant for the ASGI server (``profiles_project/asgi.py``). Each open
+stream is one coroutine waiting on the broadcaster, not a thread. Under WSGI a
+response cannot stay open without holding a worker, so each request answers at
+once with whatever is pending (or a heartbeat) and ends. The client reconnects
+after ``RETRY_MS`` with ``Last-Event-ID``, which turns the stream into polling.
+Heartbeats carry the current event id, so nothing published between two polls
+is missed.
+
+Browsers' ``EventSource`` cannot send an ``Authorization`` header; pass the
+token as ``?token=`` instead.
+
+The backend decides who sees an event. With ``BACKEND = None`` events fan out
+within the process that published them. A ``CACHES`` alias keeps the event log
+in that cache, shared by every worker; each stream polls it every
+``POLL_INTERVAL`` seconds. That alias needs an atomic ``incr`` (Redis,
+Memcached).
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .cache_utils import incr_or_seed
+from .conf import app_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": None,
+    "KEY_PREFIX": "events",
+    "HISTORY": 1000,
+    "HEARTBEAT": 15,
+    "RETRY_MS": 3000,
+    "LIKES_INTERVAL": 1.0,
+    "POLL_INTERVAL": 0.5,
+}
+
+
+conf = app_settings("EVENTS", DEFAULTS)
+
+
+class LocalBackend:
+    """Event log and wake-ups in process memory."""
+
+    def __init__(self, history=1000):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._waiters = set()
+
+    def publish(self, event, data):
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            self._events.append({"id": event_id, "event": event, "data": data})
+            waiters = list(self._waiters)
+        # Publishers run in request threads; each stream waits on its own loop.
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:  # The loop has closed.
+                pass
+        return event_id
+
+    def since(self, last_id):
+        """Events after ``last_id``, or ``None`` if some are no longer kept."""
+        with self._lock:
+            if last_id > self._last_id:
+                # An id from before a restart.
+                return None
+            first_id = self._events[0]["id"] if self._events else self._last_id + 1
+            if last_id + 1 < first_id:
+                return None
+            return list(itertools.islice(self._events, last_id + 1 - first_id, None))
+
+    async def alast_id(self):
+        return self._last_id
+
+    async def wait(self, last_id, timeout):
+        """Events after ``last_id``; ``[]`` if none came within ``timeout``."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            events = self.since(last_id)
+            if events == []:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+                events = self.since(last_id)
+            return events
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class CacheBackend:
+    """Event log in a Django cache shared by all workers; readers poll it."""
+
+    def __init__(self, cache, key_prefix="events", history=1000, poll_interval=0.5):
+        self.cache = cache
+        self.key_prefix = key_prefix
+        self.history = history
+        self.poll_interval = poll_interval
+
+    def _key(self, event_id):
+        return f"{self.key_prefix}:{event_id}"
+
+    @property
+    def _seq_key(self):
+        return f"{self.key_prefix}:seq"
+
+    def _start_id(self):
+        # Microseconds: nanosecond ids would not fit a JavaScript number.
+        return time.time_ns() // 1000
+
+    def publish(self, event, data):
+        event_id = incr_or_seed(self.cache, self._seq_key, seed=self._start_id())
+        self.cache.set(
+            self._key(event_id), {"id": event_id, "event": event, "data": data}, None
+        )
+        self.cache.delete(self._key(event_id - self.history))
+        return event_id
+
+    async def alast_id(self):
+        last_id = await self.cache.aget(self._seq_key)
+        if last_id is None:
+            await self.cache.aadd(self._seq_key, self._start_id(), None)
+            last_id = await self.cache.aget(self._seq_key)
+        return last_id
+
+    async def asince(self, last_id):
+        newest = await self.alast_id()
+        if last_id > newest or newest - last_id > self.history:
+            return None
+        keys = [self._key(event_id) for event_id in range(last_id + 1, newest + 1)]
+        found = await self.cache.aget_many(keys) if keys else {}
+        events = []
+        for key in keys:
+            if key not in found:
+                break
+            events.append(found[key])
+        if len(events) < len(found):
+            # A hole before stored events: one was evicted (or is still being
+            # written). Resetting is always safe; skipping could lose it.
+            return None
+        return events
+
+    async def wait(self, last_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            events = await self.asince(last_id)
+            if events is None or events:
+                return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+
+def encode(event):
+    data = json.dumps(event["data"], cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+class EventBroadcaster:
+    def __init__(self, backend, heartbeat=15, retry_ms=3000, likes_interval=1.0):
+        self.backend = backend
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.likes_interval = likes_interval
+        self._lock = threading.Lock()
+        self._like_counts = {}
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        backend = conf("BACKEND")
+        if backend:
+            store = CacheBackend(
+                caches[backend],
+                key_prefix=conf("KEY_PREFIX"),
+                history=conf("HISTORY"),
+                poll_interval=conf("POLL_INTERVAL"),
+            )
+        else:
+            store = LocalBackend(history=conf("HISTORY"))
+        return cls(
+            store,
+            heartbeat=conf("HEARTBEAT"),
+            retry_ms=conf("RETRY_MS"),
+            likes_interval=conf("LIKES_INTERVAL"),
+        )
+
+    def publish(self, event, data):
+        return self.backend.publish(event, data)
+
+    def feed_created(self, data):
+        """Announce a new post once its transaction commits."""
+        transaction.on_commit(partial(self.publish, "feed.created", dict(data)))
+
+    def likes_changed(self, feed_id, likes_count):
+        """Queue a feed's new like count for the next ``feed.likes_changed``."""
+        if not self.likes_interval:
+            self._publish_likes({feed_id: likes_count})
+            return
+        with self._lock:
+            self._like_counts[feed_id] = likes_count
+        self._ensure_flusher()
+
+    def flush_likes(self):
+        with self._lock:
+            counts, self._like_counts = self._like_counts, {}
+        if counts:
+            self._publish_likes(counts)
+
+    def _publish_likes(self, counts):
+        feeds = [{"id": pk, "likes_count": count} for pk, count in sorted(counts.items())]
+        self.publish("feed.likes_changed", {"feeds": feeds})
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="event-likes", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.likes_interval)
+            try:
+                self.flush_likes()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Publishing like counts failed")
+
+    async def stream(self, last_event_id=None, once=False):
+        """
+        SSE-encoded chunks from ``last_event_id`` (or from now) onwards. With
+        ``once`` the stream sends what is already pending, or a heartbeat,
+        without waiting, and ends.
+        """
+        yield f"retry: {self.retry_ms}\n\n"
+        try:
+            last_id = int(last_event_id)
+        except (TypeError, ValueError):
+            last_id = await self.backend.alast_id()
+
+        timeout = 0 if once else self.heartbeat
+        while True:
+            events = await self.backend.wait(last_id, timeout)
+            if events is None:
+                last_id = await self.backend.alast_id()
+                yield encode({"id": last_id, "event": "stream.reset", "data": {}})
+            elif not events:
+                # An id without data moves the client's Last-Event-ID only.
+                yield f"id: {last_id}\n: heartbeat\n\n"
+            else:
+                for event in events:
+                    yield encode(event)
+                last_id = events[-1]["id"]
+            if once:
+                return
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """The process's broadcaster, built from ``EVENTS`` on first use."""
+    global _broadcaster  # pylint: disable=global-statement
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = EventBroadcaster.from_settings()
+    return _broadcaster
+
+
+@conf.on_change
+def _reset_broadcaster():
+    global _broadcaster  # pylint: disable=global-statement
+    with _broadcaster_lock:
+        _broadcaster = None
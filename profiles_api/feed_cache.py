@@ -0,0 +1,296 @@
+"""
+Shared cache of rendered ``GET /api/feeds/`` pages.
+
+Every student sees the same global feed list, so pages are built once and
+served to everyone until a write makes them stale:
+
+* A *generation* counter is bumped (at write time and again on commit) whenever a feed is created,
+  edited or deleted, or something rendered in a feed changes outside ``save()``
+  (image variants, an author renaming themselves). A page built for an older
+  generation is stale.
+* Likes bump a separate *likes generation*. A page that only missed likes stays
+  fresh for ``LIKE_LAG`` seconds after it was built, so like counts lag by a
+  bounded interval instead of forcing a rebuild per like.
+
+Stale pages are rebuilt by one request at a time (a lock taken with ``add``);
+requests that lose the race serve the stale page meanwhile, or wait up to
+``LOCK_WAIT`` seconds if there is none yet.
+
+Storage is pluggable: a ``CACHES`` alias in ``BACKEND`` shares pages, counters
+and the lock between worker processes. ``BACKEND = None`` keeps everything in a
+per-process dict, where a write in one worker never marks the other workers'
+pages stale; so ``ENABLED = None`` (the default) caches only when ``BACKEND``
+is set, and ``ENABLED = True`` with no backend is for single-process servers.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .cache_utils import incr_or_seed
+from .conf import app_settings
+from .read_serializers import feed_reader
+
+DEFAULTS = {
+    "ENABLED": None,
+    "BACKEND": None,
+    "KEY_PREFIX": "feedpage",
+    "TTL": 300,
+    "LIKE_LAG": 5,
+    "LOCK_TIMEOUT": 10,
+    "LOCK_WAIT": 2,
+    "MAX_SIZE": 512,
+}
+
+conf = app_settings("FEED_CACHE", DEFAULTS)
+
+
+class LocalStore:
+    """The subset of the Django cache API used here, in process memory."""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                entry = self._live(key, now)
+                if entry is not None:
+                    self._data.move_to_end(key)
+                    found[key] = entry[0]
+            return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    async def aget_many(self, keys):
+        return self.get_many(keys)
+
+    def _store(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._store(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._store(key, value, timeout)
+            return True
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                raise ValueError(f"Key {key!r} not found")
+            self._data[key] = (entry[0] + delta, entry[1])
+            return entry[0] + delta
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FeedPageCache:
+    """Generation-checked page cache with single-flight rebuilds."""
+
+    def __init__(self, store, key_prefix="feedpage", ttl=300, like_lag=5,
+                 lock_timeout=10, lock_wait=2, enabled=True):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.configure(store, key_prefix, ttl, like_lag, lock_timeout, lock_wait, enabled)
+
+    def configure(self, store, key_prefix="feedpage", ttl=300, like_lag=5,
+                  lock_timeout=10, lock_wait=2, enabled=True):
+        self.store = store
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.like_lag = like_lag
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.enabled = enabled
+        self.gen_key = f"{key_prefix}:gen"
+        self.likes_gen_key = f"{key_prefix}:likes_gen"
+
+    @classmethod
+    def from_settings(cls):
+        page_cache = cls(None)
+        page_cache.load_settings()
+        return page_cache
+
+    def load_settings(self):
+        """(Re)read ``FEED_CACHE``; a per-process store starts out empty."""
+        backend = conf("BACKEND")
+        self.configure(
+            caches[backend] if backend else LocalStore(conf("MAX_SIZE")),
+            key_prefix=conf("KEY_PREFIX"),
+            ttl=conf("TTL"),
+            like_lag=conf("LIKE_LAG"),
+            lock_timeout=conf("LOCK_TIMEOUT"),
+            lock_wait=conf("LOCK_WAIT"),
+            enabled=bool(backend) if conf("ENABLED") is None else conf("ENABLED"),
+        )
+
+    # -- generations ---------------------------------------------------------
+
+    def _bump(self, key):
+        incr_or_seed(self.store, key)
+
+    def _bump_now_and_on_commit(self, key):
+        # The second bump discards pages rebuilt from not-yet-committed data
+        # between the write and its commit.
+        self._bump(key)
+        transaction.on_commit(lambda: self._bump(key))
+
+    def bump(self):
+        """Mark every cached page stale."""
+        self._bump_now_and_on_commit(self.gen_key)
+
+    def bump_likes(self):
+        """Mark cached like counts as lagging (see ``LIKE_LAG``)."""
+        self._bump_now_and_on_commit(self.likes_gen_key)
+
+    # -- lookup --------------------------------------------------------------
+
+    def _is_fresh(self, entry, gen, likes_gen, now):
+        if entry["gen"] != gen:
+            return False
+        return entry["likes_gen"] == likes_gen or now - entry["built_at"] < self.like_lag
+
+    def _build(self, key, build, gen, likes_gen):
+        entry = {
+            "gen": gen,
+            "likes_gen": likes_gen,
+            "built_at": time.time(),
+            "value": build(),
+        }
+        self.store.set(key, entry, self.ttl)
+        return entry
+
+    def _page_key(self, variant):
+        return f"{self.key_prefix}:page:{variant}"
+
+    def _lookup_keys(self, variant):
+        return [self.gen_key, self.likes_gen_key, self._page_key(variant)]
+
+    def _fresh(self, variant, found):
+        """The fresh cached value among ``found`` (a ``get_many`` result), or ``None``."""
+        entry = found.get(self._page_key(variant))
+        gen = found.get(self.gen_key)
+        likes_gen = found.get(self.likes_gen_key)
+        if entry is not None and self._is_fresh(entry, gen, likes_gen, time.time()):
+            self.hits += 1
+            return entry["value"]
+        return None
+
+    def lookup(self, variant):
+        """The cached value for ``variant`` if it is fresh, else ``None``."""
+        if not self.enabled:
+            return None
+        return self._fresh(variant, self.store.get_many(self._lookup_keys(variant)))
+
+    async def alookup(self, variant):
+        """``lookup`` with the async cache API, for async views."""
+        if not self.enabled:
+            return None
+        found = await self.store.aget_many(self._lookup_keys(variant))
+        return self._fresh(variant, found)
+
+    def fetch(self, variant, build):
+        """
+        Return the cached value for ``variant`` (a page's cursor and size) or
+        the result of ``build()``, cached for the current generation.
+        """
+        if not self.enabled:
+            return build()
+
+        key = self._page_key(variant)
+        found = self.store.get_many(self._lookup_keys(variant))
+        value = self._fresh(variant, found)
+        if value is not None:
+            return value
+        gen = found.get(self.gen_key)
+        likes_gen = found.get(self.likes_gen_key)
+        entry = found.get(key)
+
+        lock_key = f"{key}:lock"
+        if self.store.add(lock_key, 1, self.lock_timeout):
+            self.misses += 1
+            try:
+                return self._build(key, build, gen, likes_gen)["value"]
+            finally:
+                self.store.delete(lock_key)
+
+        # Someone else is rebuilding this page.
+        if entry is not None:
+            self.stale_hits += 1
+            return entry["value"]
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = self.store.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry["value"]
+        self.misses += 1
+        return build()
+
+    def clear(self):
+        if isinstance(self.store, LocalStore):
+            self.store.clear()
+        else:
+            self._bump(self.gen_key)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+
+def page_variant(paginator, request, reader=feed_reader):
+    """Cache key part for the page ``request`` asks for, as ``reader`` renders it."""
+    fields = "*" if reader is feed_reader else ",".join(reader.columns)
+    return f"{paginator.cache_variant(request)}:{fields}"
+
+
+def build_feed_page(paginator, feeds, request, view=None, reader=feed_reader):
+    """One feed page and the cursor of the next, for caching."""
+    rows = paginator.paginate_queryset(feeds, request, view=view)
+    return {
+        "results": reader.many(rows),
+        "next_cursor": paginator.next_cursor,
+    }
+
+
+feed_page_cache = FeedPageCache.from_settings()
+conf.on_change(feed_page_cache.load_settings)
@@ -0,0 +1,108 @@
+"""Bounded worker pool for password hashing on the login path."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+from django.utils.crypto import get_random_string
+
+from .conf import app_settings
+
+DEFAULTS = {
+    "MAX_WORKERS": 2,
+    "MAX_PENDING": 16,
+    "TIMEOUT": 10,
+}
+
+conf = app_settings("LOGIN_HASHING", DEFAULTS)
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing queue is full and the request should back off."""
+
+
+class HashingPool:
+    """
+    Run password checks on at most ``max_workers`` threads (hashlib's PBKDF2
+    releases the GIL, so these run in parallel) with at most ``max_pending``
+    checks queued or running. Beyond that, ``run`` fails fast with
+    ``HashingPoolBusy`` instead of letting a login burst tie up every request
+    worker.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, timeout=10):
+        self._executor = None
+        self._dummy_hash = None
+        self.configure(max_workers, max_pending, timeout)
+
+    def configure(self, max_workers, max_pending, timeout):
+        """Resize the pool; checks already submitted finish on the old one."""
+        old_executor = self._executor
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    @classmethod
+    def from_settings(cls):
+        pool = cls()
+        pool.load_settings()
+        return pool
+
+    def load_settings(self):
+        """(Re)read ``LOGIN_HASHING``."""
+        self.configure(conf("MAX_WORKERS"), conf("MAX_PENDING"), conf("TIMEOUT"))
+
+    def run(self, func, *args):
+        # Release into the semaphore the slot came from, even if the pool is
+        # reconfigured meanwhile.
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingPoolBusy
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Free the slot when the hash finishes, even if we stop waiting.
+        future.add_done_callback(lambda _: slots.release())
+        return future.result(timeout=self.timeout)
+
+    @property
+    def dummy_hash(self):
+        if self._dummy_hash is None:
+            self._dummy_hash = make_password(get_random_string(32))
+        return self._dummy_hash
+
+    def verify(self, password, encoded):
+        """
+        Check ``password`` against ``encoded``. With ``encoded=None`` (unknown
+        email) a decoy hash of the same cost is checked, so the response time
+        does not reveal whether the account exists.
+        """
+        if encoded is None:
+            self.run(check_password, password, self.dummy_hash)
+            return False
+        return self.run(check_password, password, encoded)
+
+
+def needs_rehash(encoded):
+    """Mirror of the upgrade test ``AbstractBaseUser.check_password`` runs."""
+    preferred = get_hasher("default")
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+hashing_pool = HashingPool.from_settings()
+conf.on_change(hashing_pool.load_settings)
@@ -0,0 +1,256 @@
+"""
+Background image pipeline for ``Feed.image`` uploads.
+
+``FeedAPIView.post`` only stores the upload and queues an ``ImageJob`` row. The
+resizing happens later, in a small in-process thread pool (``IN_PROCESS_WORKERS``)
+or in ``manage.py process_images``, and writes WebP variants without EXIF, XMP or
+ICC metadata. Both kinds of worker claim jobs with a conditional UPDATE, so they
+can run side by side without a broker.
+
+The in-process pool also retries failed jobs and picks up jobs left running by
+a worker that died, each time it finishes one. Without ``process_images``,
+those wait for the next upload in that process.
+
+The same job also rewrites the original without metadata (``strip_original``)
+once; retries only rebuild the variants. Until it has run, the original is
+served as uploaded.
+
+A job gets ``MAX_ATTEMPTS`` tries, counting runs whose worker died (say, out
+of memory on a decompression bomb); after that it is marked failed.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageOps
+
+from . import routing
+from .conf import app_settings
+from .feed_cache import feed_page_cache
+from .models import Feed, ImageJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "VARIANTS": {"thumb": 320, "medium": 1080},
+    "QUALITY": 80,
+    "IN_PROCESS_WORKERS": 1,
+    "MAX_ATTEMPTS": 3,
+    "STALE_AFTER": 600,
+}
+
+# Originals in these formats are re-encoded by their job to drop their metadata.
+STRIP_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+conf = app_settings("IMAGE_PIPELINE", DEFAULTS)
+
+
+def _get_executor():
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=conf("IN_PROCESS_WORKERS"),
+                thread_name_prefix="image-pipeline",
+            )
+        return _executor
+
+
+def enqueue(feed):
+    """Queue variant generation for ``feed``; runs once the transaction commits."""
+    job = ImageJob.objects.create(feed=feed)
+    if conf("IN_PROCESS_WORKERS") > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+        # Retries and orphaned jobs are queued rows with nothing scheduled to
+        # run them unless process_images is deployed; take them now.
+        drain()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("In-process image worker failed")
+    finally:
+        close_old_connections()
+
+
+def claim(job_id):
+    """Atomically move a pending job to running; False if someone else has it."""
+    return bool(
+        ImageJob.objects.filter(pk=job_id, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING,
+            attempts=F("attempts") + 1,
+            started_at=timezone.now(),
+        )
+    )
+
+
+def release_stale_jobs():
+    """
+    Requeue jobs whose worker died mid-run, or fail them once they have used
+    up ``MAX_ATTEMPTS``. Returns the number requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=conf("STALE_AFTER"))
+    stale = ImageJob.objects.filter(status=ImageJob.RUNNING, started_at__lt=cutoff)
+    stale.filter(attempts__gte=conf("MAX_ATTEMPTS")).update(
+        status=ImageJob.FAILED, error="Worker stopped while running the job."
+    )
+    return stale.update(status=ImageJob.PENDING)
+
+
+def drain():
+    """Requeue stale jobs, then run queued jobs until none are pending."""
+    processed = 0
+    release_stale_jobs()
+    while (job_id := next_job_id()) is not None:
+        if run_job(job_id):
+            processed += 1
+    return processed
+
+
+def next_job_id():
+    return (
+        ImageJob.objects.filter(status=ImageJob.PENDING)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def run_job(job_id):
+    """Claim and process one job. Returns True if this call did the work."""
+    if not claim(job_id):
+        return False
+
+    # The job and feed were written moments ago; replicas may not have them.
+    with routing.use_primary():
+        job = ImageJob.objects.select_related("feed").get(pk=job_id)
+    try:
+        if job.feed.image and not job.original_stripped:
+            strip_original(job.feed)
+            job.original_stripped = True
+            job.save(update_fields=["original_stripped"])
+        variants = build_variants(job.feed)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Image job %s failed", job_id)
+        retry = job.attempts < conf("MAX_ATTEMPTS")
+        job.status = ImageJob.PENDING if retry else ImageJob.FAILED
+        job.error = repr(exc)
+        job.save(update_fields=["status", "error"])
+        return True
+
+    Feed.objects.filter(pk=job.feed_id).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    feed_page_cache.bump()
+    job.status = ImageJob.DONE
+    job.error = ""
+    job.save(update_fields=["status", "error"])
+    return True
+
+
+def _normalize_mode(image):
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    if image.mode in ("LA", "PA") or "transparency" in image.info:
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+
+def strip_original(feed):
+    """
+    Replace ``feed``'s stored original with a ``strip_metadata`` copy under a
+    new name, and delete the old file. Returns whether it was rewritten.
+    """
+    storage = feed.image.storage
+    old_name = feed.image.name
+    with feed.image.open("rb") as source:
+        upload = ContentFile(source.read(), name=os.path.basename(old_name))
+    stripped = strip_metadata(upload)
+    if stripped is upload:
+        return False
+    new_name = storage.save(old_name, stripped)
+    Feed.objects.filter(pk=feed.pk).update(image=new_name, updated_at=timezone.now())
+    storage.delete(old_name)
+    feed_page_cache.bump()
+    feed.image = new_name
+    return True
+
+
+def build_variants(feed):
+    """
+    Write one WebP per ``VARIANTS`` entry next to the original and return
+    ``{variant: storage_name}``. Re-encoding without ``exif``/``icc_profile``
+    arguments drops the upload's metadata.
+    """
+    if not feed.image:
+        return {}
+
+    with feed.image.open("rb") as source:
+        image = Image.open(source)
+        image.load()
+    image = _normalize_mode(ImageOps.exif_transpose(image))
+
+    storage = feed.image.storage
+    base, _ = os.path.splitext(feed.image.name)
+    variants = {}
+    for name, max_side in conf("VARIANTS").items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, "WEBP", quality=conf("QUALITY"), method=4)
+        variants[name] = storage.save(
+            f"{base}_{name}.webp", ContentFile(buffer.getvalue())
+        )
+    return variants
+
+
+def strip_metadata(upload):
+    """
+    Return ``upload`` re-encoded in its own format and under its own name,
+    without EXIF (GPS position, camera serial), XMP or text metadata. The EXIF
+    orientation is applied to the pixels first and the ICC profile is kept, so
+    the image looks the same. Animated images and other formats are returned
+    unchanged.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format not in STRIP_FORMATS or getattr(image, "is_animated", False):
+        upload.seek(0)
+        return upload
+
+    fmt = image.format
+    options = {}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    if image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if fmt == "JPEG":
+        # Pillow would otherwise copy the upload's COM segment.
+        options["comment"] = b""
+        if image.format == "JPEG":
+            # Still the decoded upload: reuse its quantization tables and
+            # subsampling, so re-encoding costs no visible quality.
+            options.update(quality="keep", subsampling="keep")
+        else:
+            options["quality"] = 95
+    elif fmt == "WEBP":
+        options["quality"] = 95
+
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue(), name=upload.name)
@@ -0,0 +1,324 @@
+"""
+Write-behind buffer for like toggles on hot posts.
+
+With ``LIKE_BUFFER["ENABLED"]`` set, ``toggle_like`` no longer writes: it reads
+the feed's counter and the user's like (one query), records the desired state
+for ``(feed, user)`` in process memory and returns. Repeated toggles of the
+same pair coalesce into one entry. A background thread flushes the buffer
+every ``FLUSH_INTERVAL`` seconds (sooner once ``MAX_PENDING`` pairs are
+waiting) in a single transaction: one bulk INSERT into ``feed_likes``, one
+DELETE and one counter UPDATE per feed. Counters move by the rows the INSERT
+reports back (``RETURNING`` on SQLite and PostgreSQL), not by the rows it was given.
+
+Until a pair is flushed, ``overlay`` adds its pending change to the
+``likes_count`` of rows read from the database, so users see their own like
+immediately.
+
+The buffer lives in the process that took the request. With several worker
+processes, a user whose next click lands on another worker toggles from the
+flushed state, so a like/unlike pair inside one flush interval can resolve to
+"liked". The flush itself reconciles against the rows actually in the table
+under a row lock, so counters stay exact. A cache-backed buffer shared by all
+workers is not offered: the Django cache API has no atomic list or
+compare-and-set to coalesce entries safely.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from .conf import app_settings
+from .feed_cache import feed_page_cache
+from .models import Feed, User
+
+logger = logging.getLogger(__name__)
+
+Like = Feed.likes.through
+
+DEFAULTS = {
+    "ENABLED": False,
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING": 5000,
+}
+
+
+conf = app_settings("LIKE_BUFFER", DEFAULTS)
+
+
+def read_like(feed_id, user_id):
+    """``(likes_count, liked)`` as stored; raises ``Feed.DoesNotExist``."""
+    liked_by_user = Like.objects.filter(feed_id=OuterRef("pk"), user_id=user_id)
+    return (
+        Feed.objects.filter(pk=feed_id)
+        .annotate(liked=Exists(liked_by_user))
+        .values_list("likes_count", "liked")
+        .get()
+    )
+
+
+class LikeBuffer:
+    """
+    Pending like states keyed by ``(feed_id, user_id)``.
+
+    Each entry is ``(liked, base)``: the desired state and the state it
+    replaces (what the table holds, or what the in-flight flush will leave
+    there). ``liked - base`` summed per feed is that feed's pending delta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._deltas = Counter()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return conf("ENABLED")
+
+    def toggle(self, feed_id, user_id):
+        """Buffered ``toggle_like``: returns ``(liked, likes_count)``."""
+        key = (feed_id, user_id)
+        likes_count, liked_in_db = read_like(feed_id, user_id)
+
+        with self._lock:
+            if key in self._pending:
+                liked, base = self._pending[key]
+            elif key in self._inflight:
+                base = liked = self._inflight[key][0]
+            else:
+                base = liked = liked_in_db
+            liked = not liked
+            self._pending[key] = (liked, base)
+            self._deltas[feed_id] += 1 if liked else -1
+            delta = self._deltas[feed_id]
+            pending = len(self._pending)
+
+        self._ensure_flusher()
+        if pending >= conf("MAX_PENDING"):
+            self._wake.set()
+        return liked, max(likes_count + delta, 0)
+
+    def pending_deltas(self, feed_ids):
+        with self._lock:
+            return {pk: self._deltas[pk] for pk in feed_ids if self._deltas.get(pk)}
+
+    def pending_states(self, user_id, feed_ids):
+        """``{feed_id: liked}`` for ``user_id``'s toggles not yet in the table."""
+        if not self._pending and not self._inflight:
+            return {}
+        states = {}
+        with self._lock:
+            # Pending entries are newer than the flush in flight.
+            for entries in (self._inflight, self._pending):
+                for feed_id in feed_ids:
+                    entry = entries.get((feed_id, user_id))
+                    if entry is not None:
+                        states[feed_id] = entry[0]
+        return states
+
+    def signature(self):
+        """
+        Every toggle not yet in the table, as sorted ``((feed_id, user_id),
+        liked)`` pairs; ``()`` when there are none. Overlays and
+        ``liked_by_me`` depend on nothing else, so validators include it.
+        """
+        if not self._pending and not self._inflight:
+            return ()
+        with self._lock:
+            stored = {key: base for key, (_, base) in self._inflight.items()}
+            wanted = {key: liked for key, (liked, _) in self._inflight.items()}
+            for key, (liked, base) in self._pending.items():
+                stored.setdefault(key, base)
+                wanted[key] = liked
+        return tuple(sorted(item for item in wanted.items() if item[1] != stored[item[0]]))
+
+    def overlay(self, rows):
+        """``rows`` (rendered feeds) with pending deltas added to ``likes_count``."""
+        if not self._deltas or not rows or "likes_count" not in rows[0]:
+            return rows
+        deltas = self.pending_deltas([row["id"] for row in rows])
+        if not deltas:
+            return rows
+        return [
+            {**row, "likes_count": max(row["likes_count"] + deltas[row["id"]], 0)}
+            if row["id"] in deltas
+            else row
+            for row in rows
+        ]
+
+    def _recount(self):
+        deltas = Counter()
+        for entries in (self._inflight, self._pending):
+            for (feed_id, _), (liked, base) in entries.items():
+                deltas[feed_id] += liked - base
+        self._deltas = Counter({pk: delta for pk, delta in deltas.items() if delta})
+
+    def flush(self):
+        """Write pending likes to the database; returns the pairs written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+
+            try:
+                changed = apply_batch(batch)
+            except Exception:
+                with self._lock:
+                    for key, (liked, base) in batch.items():
+                        if key in self._pending:
+                            self._pending[key] = (self._pending[key][0], base)
+                        else:
+                            self._pending[key] = (liked, base)
+                    self._inflight = {}
+                    self._recount()
+                raise
+
+            with self._lock:
+                self._inflight = {}
+                self._recount()
+            if changed:
+                # The overlay for these likes is gone, so cached pages must not
+                # keep serving the pre-flush counts for LIKE_LAG; this costs
+                # one rebuild per flush, not one per like.
+                feed_page_cache.bump()
+            return len(batch)
+
+    def _ensure_flusher(self):
+        interval = conf("FLUSH_INTERVAL")
+        if not interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(interval,), name="like-buffer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self, interval):
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Flushing buffered likes failed; will retry")
+            finally:
+                close_old_connections()
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+            self._inflight = {}
+            self._deltas = Counter()
+
+
+def _like_rows(feed_ids):
+    return Counter(
+        dict(
+            Like.objects.filter(feed_id__in=feed_ids)
+            .values("feed_id")
+            .annotate(rows=Count("pk"))
+            .values_list("feed_id", "rows")
+        )
+    )
+
+
+def _insert_likes(pairs, chunk_size=500):
+    """
+    INSERT the ``(feed_id, user_id)`` pairs, skipping ones already present, and
+    return a ``Counter`` of rows actually inserted per feed.
+    """
+    inserted = Counter()
+    if not pairs:
+        return inserted
+    if connection.vendor not in ("sqlite", "postgresql"):
+        # No ON CONFLICT ... RETURNING: count the feeds' rows around the insert.
+        feed_ids = {feed_id for feed_id, _ in pairs}
+        before = _like_rows(feed_ids)
+        Like.objects.bulk_create(
+            [Like(feed_id=feed_id, user_id=user_id) for feed_id, user_id in pairs],
+            ignore_conflicts=True,
+        )
+        inserted.update(_like_rows(feed_ids))
+        inserted.subtract(before)
+        return inserted
+    table = connection.ops.quote_name(Like._meta.db_table)
+    feed_column = connection.ops.quote_name(Like._meta.get_field("feed").column)
+    user_column = connection.ops.quote_name(Like._meta.get_field("user").column)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start : start + chunk_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({feed_column}, {user_column}) VALUES "
+                + ", ".join(["(%s, %s)"] * len(chunk))
+                + f" ON CONFLICT DO NOTHING RETURNING {feed_column}",
+                [value for pair in chunk for value in pair],
+            )
+            inserted.update(feed_id for (feed_id,) in cursor.fetchall())
+    return inserted
+
+
+def apply_batch(batch):
+    """
+    Make ``feed_likes`` match the desired states in ``batch`` and move each
+    feed's counter by the rows actually inserted or deleted. Returns whether
+    anything changed.
+    """
+    feed_ids = {feed_id for feed_id, _ in batch}
+    user_ids = {user_id for _, user_id in batch}
+    with transaction.atomic():
+        # Row locks serialize flushes of the same feeds across processes.
+        live_feeds = set(
+            Feed.objects.select_for_update()
+            .filter(pk__in=feed_ids)
+            .values_list("pk", flat=True)
+        )
+        live_users = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+        existing = set(
+            Like.objects.filter(feed_id__in=live_feeds, user_id__in=user_ids).values_list(
+                "feed_id", "user_id"
+            )
+        )
+
+        added = [
+            (feed_id, user_id)
+            for (feed_id, user_id), (liked, _) in batch.items()
+            if liked
+            and (feed_id, user_id) not in existing
+            and feed_id in live_feeds
+            and user_id in live_users
+        ]
+        removed = defaultdict(list)
+        for (feed_id, user_id), (liked, _) in batch.items():
+            if not liked and (feed_id, user_id) in existing:
+                removed[feed_id].append(user_id)
+
+        # Only rows really inserted count: a writer outside the buffer may
+        # have added some of these pairs since ``existing`` was read.
+        deltas = _insert_likes(added)
+        for feed_id, users in removed.items():
+            deltas[feed_id] -= Like.objects.filter(
+                feed_id=feed_id, user_id__in=users
+            ).delete()[0]
+
+        now = timezone.now()
+        for feed_id, delta in deltas.items():
+            if delta:
+                Feed.objects.filter(pk=feed_id).update(
+                    likes_count=F("likes_count") + delta, updated_at=now
+                )
+    return any(deltas.values())
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,93 @@
+"""Like toggle and per-user like status on the ``feed_likes`` through table."""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .feed_cache import feed_page_cache
+from .like_buffer import Like, like_buffer, read_like
+from .models import Feed
+
+
+def toggle_like(feed_id, user_id):
+    """
+    Flip ``user_id``'s like on ``feed_id`` and return ``(liked, likes_count)``.
+
+    Runs at most three queries whatever the number of likers: one read of the
+    feed's counter plus an indexed membership test, one INSERT or DELETE on the
+    through table, and one ``F()`` update of ``Feed.likes_count``. Raises
+    ``Feed.DoesNotExist`` for an unknown feed.
+
+    Concurrent double-clicks are resolved by the ``(feed_id, user_id)`` unique
+    constraint on the through table: the losing INSERT rolls back with the
+    counter untouched, and a DELETE that finds no row leaves the counter alone.
+
+    With ``LIKE_BUFFER["ENABLED"]`` only the read runs here and the write is
+    deferred to ``like_buffer``.
+    """
+    if like_buffer.enabled:
+        return like_buffer.toggle(feed_id, user_id)
+
+    likes_count, liked = read_like(feed_id, user_id)
+
+    try:
+        with transaction.atomic():
+            if liked:
+                deleted, _ = Like.objects.filter(
+                    feed_id=feed_id, user_id=user_id
+                ).delete()
+                delta = -deleted
+            else:
+                Like.objects.create(feed_id=feed_id, user_id=user_id)
+                delta = 1
+
+            if delta:
+                # updated_at moves too, so conditional GETs see the change.
+                Feed.objects.filter(pk=feed_id).update(
+                    likes_count=F("likes_count") + delta, updated_at=timezone.now()
+                )
+    except IntegrityError:
+        # Another request inserted the same like first; it owns the increment.
+        return True, likes_count + 1
+
+    if delta:
+        feed_page_cache.bump_likes()
+    return not liked, max(likes_count + delta, 0)
+
+
+def _apply_pending(liked, user_id, feed_ids):
+    for feed_id, state in like_buffer.pending_states(user_id, feed_ids).items():
+        if state:
+            liked.add(feed_id)
+        else:
+            liked.discard(feed_id)
+    return liked
+
+
+def liked_feed_ids(user, feed_ids):
+    """
+    The subset of ``feed_ids`` that ``user`` likes: one ``IN`` query on the
+    through table for the whole page, plus any toggles still in the buffer.
+    """
+    if not feed_ids or getattr(user, "role", None) != "student":
+        return set()
+    liked = set(
+        Like.objects.filter(user_id=user.id, feed_id__in=feed_ids).values_list(
+            "feed_id", flat=True
+        )
+    )
+    return _apply_pending(liked, user.id, feed_ids)
+
+
+async def aliked_feed_ids(user, feed_ids):
+    """``liked_feed_ids`` for async views."""
+    if not feed_ids or getattr(user, "role", None) != "student":
+        return set()
+    rows = Like.objects.filter(user_id=user.id, feed_id__in=feed_ids)
+    liked = {feed_id async for feed_id in rows.values_list("feed_id", flat=True)}
+    return _apply_pending(liked, user.id, feed_ids)
+
+
+def mark_liked_by_me(rows, liked):
+    """Rendered feeds with ``liked_by_me`` set (pages are shared; this is not)."""
+    return [{**row, "liked_by_me": row["id"] in liked} for row in rows]
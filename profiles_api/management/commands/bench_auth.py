@@ -0,0 +1,65 @@
+"""Micro-benchmark of per-request JWT authentication overhead."""
+
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from profiles_api import authentication
+from profiles_api.authentication import SimpleJWTAuthentication, VerifiedTokenMemo
+from profiles_api.models import User
+
+
+class Command(BaseCommand):
+    help = "Time SimpleJWTAuthentication.authenticate with and without the token memo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+        parser.add_argument(
+            "--email", help="User to authenticate as (default: the first user)."
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["email"]:
+            users = users.filter(email=options["email"])
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to authenticate as; create one first.")
+
+        payload = {
+            "user_id": user.id,
+            "email": user.email,
+            "exp": datetime.utcnow() + timedelta(hours=2),
+            "iat": datetime.utcnow(),
+        }
+        token = jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+        request = APIRequestFactory().get(
+            "/api/feeds/", HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        backend = SimpleJWTAuthentication()
+        iterations = options["iterations"]
+
+        original = authentication.token_memo
+        try:
+            results = {}
+            for label, memo in (
+                ("without memo", VerifiedTokenMemo(max_size=0)),
+                ("with memo", VerifiedTokenMemo()),
+            ):
+                authentication.token_memo = memo
+                backend.authenticate(request)  # warm the principal cache
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    backend.authenticate(request)
+                results[label] = (time.perf_counter() - start) / iterations
+        finally:
+            authentication.token_memo = original
+
+        for label, per_call in results.items():
+            self.stdout.write(f"{label:>13}: {per_call * 1e6:8.2f} us/request")
+        speedup = results["without memo"] / results["with memo"]
+        self.stdout.write(self.style.SUCCESS(f"speedup: {speedup:.2f}x"))
@@ -0,0 +1,96 @@
+"""
+Benchmark the bulk user import against one-at-a-time registration.
+
+Everything runs inside a transaction that is rolled back. By default both paths
+use Django's MD5 hasher so the numbers show the validation and INSERT overhead;
+pass ``--real-hasher`` to include the configured PBKDF2 cost, which dominates
+and scales with ``--workers``.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from profiles_api import bulk_import
+from profiles_api.serializers import UserSerializer
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class Rollback(Exception):
+    pass
+
+
+def synthetic_rows(count, prefix):
+    for i in range(count):
+        yield i + 1, {
+            "email": f"{prefix}{i}@import.example.com",
+            "name": f"Student {i}",
+            "password": "secret1",
+            "role": "student",
+        }
+
+
+class Command(BaseCommand):
+    help = "Time importing synthetic users in bulk vs. per-row serializer saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument(
+            "--baseline-users",
+            type=int,
+            default=2000,
+            help="Rows to time on the per-row path; the rate is extrapolated.",
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--workers", type=int)
+        parser.add_argument("--real-hasher", action="store_true")
+
+    def handle(self, *args, **options):
+        hashers = {} if options["real_hasher"] else {"PASSWORD_HASHERS": FAST_HASHERS}
+        with override_settings(**hashers):
+            per_row = self.timed(self.per_row, options["baseline_users"])
+            bulk = self.timed(
+                self.bulk,
+                options["users"],
+                options["batch_size"],
+                options["workers"],
+            )
+
+        per_row_rate = options["baseline_users"] / per_row
+        bulk_rate = options["users"] / bulk
+        self.stdout.write(
+            f"per-row: {per_row_rate:9.0f} users/s "
+            f"(~{options['users'] / per_row_rate:.1f}s for {options['users']})"
+        )
+        self.stdout.write(
+            f"bulk:    {bulk_rate:9.0f} users/s ({bulk:.1f}s for {options['users']})"
+        )
+        self.stdout.write(f"speedup: {bulk_rate / per_row_rate:.1f}x")
+
+    @staticmethod
+    def timed(func, *args):
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                func(*args)
+                raise Rollback
+        except Rollback:
+            pass
+        return time.perf_counter() - start
+
+    @staticmethod
+    def per_row(count):
+        for _, row in synthetic_rows(count, "perrow"):
+            serializer = UserSerializer(data=row)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+    @staticmethod
+    def bulk(count, batch_size, workers):
+        report = bulk_import.import_users(
+            synthetic_rows(count, "bulk"), batch_size=batch_size, workers=workers
+        )
+        assert report.created == count, report.errors[:5]
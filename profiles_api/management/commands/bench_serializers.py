@@ -0,0 +1,57 @@
+"""Compare rows/sec of the DRF serializers against the compiled read path."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from profiles_api.models import Feed, User
+from profiles_api.read_serializers import feed_reader
+from profiles_api.serializers import FeedSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark FeedSerializer against the compiled read serializer on "
+        "synthetic feeds. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            teacher = User.objects.create_user(
+                "bench-teacher@example.invalid", "Bench Teacher", None, role="teacher"
+            )
+            Feed.objects.bulk_create(
+                Feed(user=teacher, text=f"benchmark post {i}", likes_count=i % 50)
+                for i in range(rows)
+            )
+            feeds = Feed.objects.filter(user=teacher)
+
+            drf = self.best_of(
+                repeat,
+                lambda: FeedSerializer(feeds.select_related("user"), many=True).data,
+            )
+            compiled = self.best_of(
+                repeat, lambda: feed_reader.many(feed_reader.values(feeds))
+            )
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"     DRF: {rows / drf:12,.0f} rows/sec")
+        self.stdout.write(f"compiled: {rows / compiled:12,.0f} rows/sec")
+        self.stdout.write(self.style.SUCCESS(f" speedup: {drf / compiled:.2f}x"))
+
+    @staticmethod
+    def best_of(repeat, func):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
@@ -0,0 +1,117 @@
+"""
+Concurrent write benchmark for the SQLite tuning profile.
+
+Runs like-style transactions (read a counter, insert a row, bump the counter)
+from several threads against a scratch database file, once with plain SQLite
+defaults and once with ``SQLITE_TUNING``, and reports commits per second and
+"database is locked" failures. The project database is never touched.
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test import override_settings
+
+from profiles_api.sqlite_tuning import apply, get_profile
+
+ALIAS = "sqlite_write_bench"
+
+
+def configure_alias(path):
+    databases = connections.configure_settings(
+        {
+            "default": connections.settings["default"],
+            ALIAS: {"ENGINE": "django.db.backends.sqlite3", "NAME": path},
+        }
+    )
+    connections.settings[ALIAS] = databases[ALIAS]
+
+
+def create_schema():
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE post (id INTEGER PRIMARY KEY, likes_count INTEGER NOT NULL)"
+        )
+        cursor.execute(
+            "CREATE TABLE post_like (id INTEGER PRIMARY KEY, post_id INTEGER, user_id INTEGER)"
+        )
+        cursor.execute("INSERT INTO post (id, likes_count) VALUES (1, 0)")
+
+
+def like_transaction(user_id):
+    with transaction.atomic(using=ALIAS):
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute("SELECT likes_count FROM post WHERE id = 1")
+            cursor.fetchone()
+            cursor.execute(
+                "INSERT INTO post_like (post_id, user_id) VALUES (1, %s)", [user_id]
+            )
+            cursor.execute("UPDATE post SET likes_count = likes_count + 1 WHERE id = 1")
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent SQLite write throughput with and without SQLITE_TUNING."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        baseline = {"ENABLED": False}
+        for label, profile in (("defaults", baseline), ("tuned", get_profile())):
+            with override_settings(SQLITE_TUNING=profile):
+                result = self.run(profile, options["threads"], options["seconds"])
+            self.stdout.write(
+                f"{label:>8}: {result['commits'] / result['elapsed']:9.1f} commits/s  "
+                f"locked errors {result['locked']}  "
+                f"journal_mode {result['journal_mode']}"
+            )
+
+    def run(self, profile, threads, seconds):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            configure_alias(os.path.join(tmpdir, "bench.sqlite3"))
+            try:
+                # The scratch file may take the persistent pragmas too.
+                apply(connections[ALIAS], profile, persistent=True)
+                create_schema()
+                with connections[ALIAS].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    journal_mode = cursor.fetchone()[0]
+                return {**self.hammer(threads, seconds), "journal_mode": journal_mode}
+            finally:
+                connections[ALIAS].close()
+                del connections[ALIAS]
+                del connections.settings[ALIAS]
+
+    @staticmethod
+    def hammer(threads, seconds):
+        counts = {"commits": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(worker_id):
+            commits = locked = 0
+            try:
+                while time.perf_counter() < deadline:
+                    try:
+                        like_transaction(worker_id)
+                        commits += 1
+                    except OperationalError:
+                        locked += 1
+            finally:
+                connections[ALIAS].close()
+            with lock:
+                counts["commits"] += commits
+                counts["locked"] += locked
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return {**counts, "elapsed": time.perf_counter() - started}
@@ -0,0 +1,281 @@
+"""
+Repeatable endpoint benchmark with JSON baselines.
+
+In-process, against a throwaway test database seeded for the run::
+
+    python manage.py benchmark --save bench/baseline.json
+    python manage.py benchmark --compare bench/baseline.json
+
+Each scenario runs ``--repeat`` times and the median of each figure is kept.
+Latency percentiles are only compared with enough samples behind them (see
+``benchmarking.compare``), so raise ``--requests`` to gate on p95 or p99.
+
+Against a real local server sharing this project's database (seed it first
+with ``manage.py seed_benchmark_data``; queries per request are read from the
+``X-DB-Queries`` header when ``REQUEST_METRICS["HEADERS"]`` is on)::
+
+    python manage.py benchmark --mode server --base-url http://127.0.0.1:8000
+"""
+
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from profiles_api import benchmarking
+from profiles_api.authentication import token_memo
+from profiles_api.feed_cache import feed_page_cache
+from profiles_api.principals import principal_cache
+
+# Benchmarks log in far faster than any client should; keep the buckets out
+# of the way (client mode only; a real server keeps its own settings).
+UNTHROTTLED = {
+    "ip": {"RATE": "1000000/s", "BURST": 1000000},
+    "email": {"RATE": "1000000/s", "BURST": 1000000},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure latency, throughput and queries per request of the main endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["client", "server"], default="client")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(benchmarking.SCENARIOS),
+            help="Scenario to run (repeatable; default: all).",
+        )
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument(
+            "--login-requests",
+            type=int,
+            default=30,
+            help="Requests for the login scenario, which is dominated by hashing.",
+        )
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Runs per scenario; the median of each figure is reported.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Server mode.")
+        parser.add_argument("--students", type=int, default=1000, help="Client mode.")
+        parser.add_argument("--teachers", type=int, default=50, help="Client mode.")
+        parser.add_argument("--feeds", type=int, default=2000, help="Client mode.")
+        parser.add_argument("--likes", type=int, default=20000, help="Client mode.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--save", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.15,
+            help="Allowed relative change in latency and throughput.",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=2.0,
+            help="Latency increases up to this many ms are treated as noise.",
+        )
+        parser.add_argument(
+            "--min-tail-samples",
+            type=int,
+            default=30,
+            help="Requests per run needed above a percentile to compare it.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        scenarios = options["scenario"] or list(benchmarking.SCENARIOS)
+
+        if options["mode"] == "client":
+            dataset, scenario_results = self.run_in_test_database(
+                scenarios, rng, options
+            )
+        else:
+            dataset = None
+            data = benchmarking.Dataset(rng)
+            scenario_results = {
+                name: self.repeat(self.drive_server, data, name, options)
+                for name in scenarios
+            }
+
+        results = {
+            "meta": {
+                "mode": options["mode"],
+                "created": datetime.now(timezone.utc).isoformat(),
+                "django": django.get_version(),
+                "dataset": dataset,
+            },
+            "scenarios": scenario_results,
+        }
+        self.report(results)
+
+        if options["save"]:
+            with open(options["save"], "w", encoding="utf-8") as out:
+                json.dump(results, out, indent=2)
+            self.stdout.write(f"Saved results to {options['save']}")
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = benchmarking.compare(
+                baseline,
+                results,
+                threshold=options["threshold"],
+                min_delta_ms=options["min_delta_ms"],
+                min_tail_samples=options["min_tail_samples"],
+            )
+            for name, metric, before, now in regressions:
+                self.stderr.write(
+                    self.style.ERROR(
+                        f"REGRESSION {name} {metric}: {before:.2f} -> {now:.2f}"
+                    )
+                )
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regression(s) against baseline."
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    @staticmethod
+    def repeat(drive, data, name, options):
+        runs = [drive(data, name, options) for _ in range(max(1, options["repeat"]))]
+        return benchmarking.combine(runs)
+
+    def count_for(self, name, options):
+        return options["login_requests"] if name == "login" else options["requests"]
+
+    @staticmethod
+    def reseed(data, name, options):
+        # Each scenario draws from its own stream, so a scenario sees the same
+        # requests whichever other scenarios run alongside it.
+        data.rng = random.Random(f"{options['seed']}:{name}")
+
+    def run_in_test_database(self, scenarios, rng, options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(LOGIN_THROTTLE=UNTHROTTLED):
+                dataset = benchmarking.seed(
+                    students=options["students"],
+                    teachers=options["teachers"],
+                    feeds=options["feeds"],
+                    likes=options["likes"],
+                    rng=rng,
+                )
+                data = benchmarking.Dataset(rng)
+                drive = partial(self.drive_client, Client())
+                results = {
+                    name: self.repeat(drive, data, name, options)
+                    for name in scenarios
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return dataset, results
+
+    @staticmethod
+    def client_request(client, data, name):
+        method, path, body, token = benchmarking.SCENARIOS[name](data)
+        extra = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        payload = json.dumps(body) if body is not None else ""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.generic(
+                method, path, payload, content_type="application/json", **extra
+            )
+            duration = time.perf_counter() - start
+        return duration, response.status_code < 400, len(queries)
+
+    def drive_client(self, client, data, name, options):
+        self.reseed(data, name, options)
+        # Start every scenario from cold caches, as the order would otherwise
+        # change its query counts.
+        cache.clear()
+        feed_page_cache.clear()
+        principal_cache.clear()
+        token_memo.clear()
+        for _ in range(options["warmup"]):
+            self.client_request(client, data, name)
+        count = self.count_for(name, options)
+        started = time.perf_counter()
+        samples = [self.client_request(client, data, name) for _ in range(count)]
+        return benchmarking.summarize(samples, time.perf_counter() - started)
+
+    @staticmethod
+    def server_request(base_url, request_args):
+        method, path, body, token = request_args
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = urllib.request.Request(
+            base_url + path,
+            data=json.dumps(body).encode() if body is not None else None,
+            headers=headers,
+            method=method,
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                ok = response.status < 400
+                queries = response.headers.get("X-DB-Queries")
+        except urllib.error.HTTPError as exc:
+            ok, queries = False, exc.headers.get("X-DB-Queries")
+        except (urllib.error.URLError, OSError):
+            ok, queries = False, None
+        duration = time.perf_counter() - start
+        return duration, ok, int(queries) if queries is not None else None
+
+    def drive_server(self, data, name, options):
+        base_url = options["base_url"].rstrip("/")
+        self.reseed(data, name, options)
+        # Build requests up front so the rng and token cache stay single-threaded.
+        warmup = [benchmarking.SCENARIOS[name](data) for _ in range(options["warmup"])]
+        requests = [
+            benchmarking.SCENARIOS[name](data)
+            for _ in range(self.count_for(name, options))
+        ]
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(lambda args: self.server_request(base_url, args), warmup))
+            started = time.perf_counter()
+            samples = list(
+                pool.map(lambda args: self.server_request(base_url, args), requests)
+            )
+        return benchmarking.summarize(samples, time.perf_counter() - started)
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'scenario':>10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8} {'errors':>7}"
+        )
+        for name, result in results["scenarios"].items():
+            queries = result["queries_per_request"]
+            queries = f"{queries:8.2f}" if queries is not None else f"{'n/a':>8}"
+            self.stdout.write(
+                f"{name:>10} {result['rps']:9.1f} {result['p50_ms']:8.2f} "
+                f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} {queries} "
+                f"{result['errors']:>3}/{result['requests'] * result['runs']}"
+            )
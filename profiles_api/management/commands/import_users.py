@@ -0,0 +1,55 @@
+"""Create users in bulk from a CSV or NDJSON file."""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from profiles_api import bulk_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from CSV (email,name,password,role header) or NDJSON. "
+        "Invalid rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Hashing processes (default: BULK_IMPORT['HASH_WORKERS'] or CPU count).",
+        )
+        parser.add_argument(
+            "--errors", help="Write the per-row errors to this file as NDJSON."
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or bulk_import.detect_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        try:
+            stream = open(options["path"], encoding="utf-8-sig", newline="")
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+        with stream:
+            report = bulk_import.import_users(
+                bulk_import.parse_rows(stream, fmt),
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+            )
+
+        if options["errors"]:
+            with open(options["errors"], "w", encoding="utf-8") as out:
+                for error in report.errors:
+                    out.write(json.dumps(error) + "\n")
+        else:
+            for error in report.errors[:20]:
+                self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+            if len(report.errors) > 20:
+                self.stderr.write(f"... {len(report.errors) - 20} more; use --errors FILE")
+
+        self.stdout.write(f"created {report.created}, failed {len(report.errors)}")
@@ -0,0 +1,110 @@
+"""
+Concurrent HTTP load test against one or more running deployments.
+
+Typical WSGI vs ASGI comparison::
+
+    gunicorn profiles_project.wsgi -w 4 -b 127.0.0.1:8001
+    PROFILES_ASYNC_API=1 uvicorn profiles_project.asgi:application \\
+        --workers 4 --port 8002
+    python manage.py loadtest --email student@example.com --password secret1 \\
+        --target wsgi=http://127.0.0.1:8001 --target asgi=http://127.0.0.1:8002 \\
+        --path /api/feeds/ --concurrency 64 --requests 5000
+"""
+
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from profiles_api.benchmarking import percentile
+
+
+class Command(BaseCommand):
+    help = "Drive concurrent requests at running servers and compare throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            required=True,
+            help="label=base_url, e.g. asgi=http://127.0.0.1:8002 (repeatable).",
+        )
+        parser.add_argument("--path", default="/api/feeds/")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--token", help="Bearer token to send.")
+        parser.add_argument("--email", help="Log in as this user to get a token.")
+        parser.add_argument("--password")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options["target"]:
+            label, sep, base_url = target.partition("=")
+            if not sep:
+                raise CommandError(f"--target must be label=url, got {target!r}")
+            targets.append((label, base_url.rstrip("/")))
+
+        for label, base_url in targets:
+            token = options["token"] or self.login(base_url, options)
+            result = self.run(base_url + options["path"], token, options)
+            self.report(label, result)
+
+    def login(self, base_url, options):
+        if not options["email"]:
+            return None
+        body = json.dumps(
+            {"email": options["email"], "password": options["password"]}
+        ).encode()
+        request = urllib.request.Request(
+            base_url + "/api/login/",
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.load(response)["token"]
+
+    def run(self, url, token, options):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        method = options["method"].upper()
+
+        def one_request(_):
+            request = urllib.request.Request(url, headers=headers, method=method)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - start, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            samples = list(pool.map(one_request, range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(duration for duration, _ in samples)
+        return {
+            "requests": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "elapsed": elapsed,
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+        }
+
+    def report(self, label, result):
+        self.stdout.write(
+            f"{label:>8}: {result['rps']:9.1f} req/s  "
+            f"p50 {result['p50'] * 1000:7.1f} ms  "
+            f"p95 {result['p95'] * 1000:7.1f} ms  "
+            f"p99 {result['p99'] * 1000:7.1f} ms  "
+            f"errors {result['errors']}/{result['requests']}"
+        )
@@ -0,0 +1,39 @@
+"""Worker that drains the ImageJob queue without an external broker."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from profiles_api import images
+
+
+class Command(BaseCommand):
+    help = "Process queued feed image jobs (thumbnails and WebP variants)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of polling.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls of an empty queue.",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            images.release_stale_jobs()
+            job_id = images.next_job_id()
+            if job_id is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+            if images.run_job(job_id):
+                processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} image jobs."))
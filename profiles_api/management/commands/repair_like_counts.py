@@ -0,0 +1,72 @@
+"""Recompute ``Feed.likes_count`` from the ``feed_likes`` table and fix drift."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from profiles_api.feed_cache import feed_page_cache
+from profiles_api.models import Feed
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized Feed.likes_count values and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of feeds to check per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted feeds without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        Like = Feed.likes.through
+        actual_counts = (
+            Like.objects.filter(feed_id=OuterRef("pk"))
+            .order_by()
+            .values("feed_id")
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    Feed.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .annotate(actual=Coalesce(Subquery(actual_counts), 0))
+                    .values_list("pk", "likes_count", "actual")[:batch_size]
+                )
+                if not rows:
+                    break
+
+                drifted = [pk for pk, stored, actual in rows if stored != actual]
+                if drifted and not dry_run:
+                    # Count again inside the UPDATE: a like toggled since the
+                    # SELECT must not be overwritten by the count read above.
+                    Feed.objects.filter(pk__in=drifted).update(
+                        likes_count=Coalesce(Subquery(actual_counts), 0),
+                        updated_at=timezone.now(),
+                    )
+                    feed_page_cache.bump_likes()
+
+            checked += len(rows)
+            repaired += len(drifted)
+            last_pk = rows[-1][0]
+
+        verb = "would repair" if dry_run else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} feeds, {verb} {repaired}.")
+        )
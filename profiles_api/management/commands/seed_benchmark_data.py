@@ -0,0 +1,42 @@
+"""Seed a synthetic, power-law shaped dataset for benchmarks."""
+
+import random
+
+from django.core.management.base import BaseCommand
+
+from profiles_api import benchmarking
+
+
+class Command(BaseCommand):
+    help = (
+        "Create benchmark users, feeds and a power-law like graph "
+        f"(all users under @{benchmarking.BENCH_DOMAIN}, password "
+        f"{benchmarking.BENCH_PASSWORD!r})."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=1000)
+        parser.add_argument("--teachers", type=int, default=50)
+        parser.add_argument("--feeds", type=int, default=2000)
+        parser.add_argument("--likes", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete previously seeded data first."
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write(f"Deleted {benchmarking.clear()} seeded rows.")
+        created = benchmarking.seed(
+            students=options["students"],
+            teachers=options["teachers"],
+            feeds=options["feeds"],
+            likes=options["likes"],
+            rng=random.Random(options["seed"]),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Seeded {students} students, {teachers} teachers, "
+                "{feeds} feeds and {likes} likes.".format(**created)
+            )
+        )
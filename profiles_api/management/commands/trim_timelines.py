@@ -0,0 +1,38 @@
+"""
+Cap every materialized timeline at TIMELINE["MAX_LENGTH"] entries.
+
+Writers already keep timelines within TIMELINE["TRIM_SLACK"] entries of the
+cap; this cuts the slack too, and every timeline back after MAX_LENGTH is
+lowered. Run it once, from cron, or as a long-lived process with
+``--interval``.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from profiles_api import timeline
+
+
+class Command(BaseCommand):
+    help = "Delete timeline entries beyond each user's capped timeline length."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-length",
+            type=int,
+            help="Entries to keep per user (default: TIMELINE['MAX_LENGTH']).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Trim again every this many seconds instead of exiting.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = timeline.trim(options["max_length"])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} timeline entries."))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,179 @@
+"""Per-endpoint latency, SQL query count and DB time histograms."""
+
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .conf import app_settings
+
+# Upper bounds in milliseconds (latency, DB time) or queries (query count).
+TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+DEFAULTS = {
+    "ENABLED": False,
+    # None sends the headers only with DEBUG on.
+    "HEADERS": None,
+}
+
+conf = app_settings("REQUEST_METRICS", DEFAULTS)
+
+
+class Histogram:
+    """Fixed-bucket histogram; the final bucket catches everything above."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of histograms keyed by resolved URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, latency_ms, queries, db_ms):
+        with self._lock:
+            histograms = self._endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self._endpoints[endpoint] = {
+                    "latency_ms": Histogram(TIME_BUCKETS),
+                    "queries": Histogram(QUERY_BUCKETS),
+                    "db_ms": Histogram(TIME_BUCKETS),
+                }
+            histograms["latency_ms"].observe(latency_ms)
+            histograms["queries"].observe(queries)
+            histograms["db_ms"].observe(db_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {name: h.snapshot() for name, h in histograms.items()}
+                for endpoint, histograms in sorted(self._endpoints.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """``execute_wrapper`` hook that counts queries and sums their wall time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+# The timer of the request being measured. Context variables follow a request
+# into sync_to_async threads, where async views run their queries on that
+# thread's own connections.
+_active_timer = ContextVar("request_query_timer", default=None)
+
+
+def time_request_queries(execute, sql, params, many, context):
+    """Execute wrapper on every connection; feeds the active request's timer."""
+    timer = _active_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install(connection):
+    """Add ``time_request_queries`` to a new connection's execute wrappers."""
+    if time_request_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_request_queries)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, query count and DB time per resolved URL name.
+
+    Enabled by ``REQUEST_METRICS["ENABLED"]``; when off, Django drops the
+    middleware at startup so it costs nothing per request. With
+    ``REQUEST_METRICS["HEADERS"]`` the numbers are also sent back as
+    ``X-Request-Time-Ms``, ``X-DB-Queries`` and ``X-DB-Time-Ms``. Runs
+    natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not conf("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        headers = conf("HEADERS")
+        self.headers = settings.DEBUG if headers is None else headers
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = _active_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_timer.reset(token)
+        return self.record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = _active_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_timer.reset(token)
+        return self.record(request, response, timer, start)
+
+    def record(self, request, response, timer, start):
+        latency_ms = (time.perf_counter() - start) * 1000
+        db_ms = timer.seconds * 1000
+
+        match = getattr(request, "resolver_match", None)
+        endpoint = (match.url_name or match.view_name) if match else "<unresolved>"
+        registry.record(endpoint, latency_ms, timer.count, db_ms)
+
+        if self.headers:
+            response["X-Request-Time-Ms"] = f"{latency_ms:.2f}"
+            response["X-DB-Queries"] = str(timer.count)
+            response["X-DB-Time-Ms"] = f"{db_ms:.2f}"
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0003_feed"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="feed",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="feed_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_likes_count(apps, schema_editor):
+    Feed = apps.get_model("profiles_api", "Feed")
+    Like = Feed.likes.through
+    counts = (
+        Like.objects.filter(feed_id=OuterRef("pk"))
+        .order_by()
+        .values("feed_id")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    Feed.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0004_feed_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+    ]
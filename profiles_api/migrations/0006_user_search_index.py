@@ -0,0 +1,104 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Rebuilding the "user" table on SQLite (any ALTER that Django implements as a
+# table remake) drops these triggers; later migrations that touch "user" call
+# restore_sqlite_triggers() to put them back.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE user_search USING fts5(
+        name, email,
+        content='user', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_search(rowid, name, email)
+        VALUES (new.id, new.name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, name, email)
+        VALUES ('delete', old.id, old.name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF name, email ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, name, email)
+        VALUES ('delete', old.id, old.name, old.email);
+        INSERT INTO user_search(rowid, name, email)
+        VALUES (new.id, new.name, new.email);
+    END
+    """,
+    "INSERT INTO user_search(user_search) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS user_search_au",
+    "DROP TRIGGER IF EXISTS user_search_ad",
+    "DROP TRIGGER IF EXISTS user_search_ai",
+    "DROP TABLE IF EXISTS user_search",
+]
+
+# icontains compiles to UPPER(col::text) LIKE UPPER(%s), so index that expression.
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS user_name_trgm ON "user" '
+    'USING gin (UPPER("name"::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS user_email_trgm ON "user" '
+    'USING gin (UPPER("email"::text) gin_trgm_ops)',
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS user_email_trgm",
+    "DROP INDEX IF EXISTS user_name_trgm",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    if "user_search" not in connection.introspection.table_names():
+        return
+    _run(schema_editor, SQLITE_FORWARD[1:])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            _run(schema_editor, SQLITE_FORWARD[:1])
+        except OperationalError:
+            # SQLite built without FTS5; search falls back to icontains.
+            return
+        _run(schema_editor, SQLITE_FORWARD[1:])
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRESQL_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_REVERSE)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRESQL_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0005_feed_likes_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0008_image_pipeline"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["updated_at"], name="feed_updated_at_idx"),
+        ),
+    ]
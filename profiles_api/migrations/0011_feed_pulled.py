@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_posts(apps, schema_editor):
+    # Posts by authors above the limit were never fanned out; keep pulling
+    # them even once the author drops back under it.
+    Feed = apps.get_model("profiles_api", "Feed")
+    limit = getattr(settings, "TIMELINE", {}).get("FANOUT_LIMIT", 5000)
+    Feed.objects.filter(user__followers_count__gt=limit).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0010_user_email_ci_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="pulled",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(
+                condition=models.Q(("pulled", True)),
+                fields=["user", "-id"],
+                name="feed_pulled_user_idx",
+            ),
+        ),
+        migrations.RunPython(mark_pulled_posts, migrations.RunPython.noop),
+    ]
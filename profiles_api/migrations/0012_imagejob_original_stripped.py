@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0011_feed_pulled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imagejob",
+            name="original_stripped",
+            field=models.BooleanField(default=False),
+        ),
+    ]
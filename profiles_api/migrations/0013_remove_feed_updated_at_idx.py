@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles_api", "0012_imagejob_original_stripped"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="feed",
+            name="feed_updated_at_idx",
+        ),
+    ]
@@ -1,6 +1,7 @@
 """Custom user model and manager for the profiles API app."""
 
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -39,6 +40,18 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, name, password, **extra_fields)
 
+    def with_email(self, email):
+        """Users whose email matches ``email`` ignoring case (one index probe)."""
+        return self.alias(email_key=Lower("email")).filter(email_key=email.lower())
+
+    def with_emails(self, emails):
+        """Users matching any of ``emails`` ignoring case, in one query."""
+        keys = {email.lower() for email in emails}
+        return self.alias(email_key=Lower("email")).filter(email_key__in=keys)
+
+    def get_by_natural_key(self, username):
+        return self.with_email(username).get()
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Application user model using email as the username field."""
@@ -53,17 +66,49 @@ class User(AbstractBaseUser, PermissionsMixin):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Denormalized count of Follow rows pointing at this user; decides whether
+    # new posts are fanned out on write or merged into timelines on read.
+    followers_count = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["name", "role"]
+    # Columns rendered inside every feed of the user's.
+    FEED_AUTHOR_FIELDS = ("name", "email")
 
     class Meta:
         db_table = "user"
+        constraints = [
+            # Uniqueness lives in the database so concurrent signups cannot
+            # both pass validation; "Ann@x.io" and "ann@x.io" are one account.
+            models.UniqueConstraint(Lower("email"), name="user_email_ci_unique"),
+        ]
 
     def __str__(self):
         return f"{self.email} ({self.role})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user.snapshot_feed_author()
+        return user
+
+    def snapshot_feed_author(self):
+        """Remember the loaded ``FEED_AUTHOR_FIELDS``; see ``feed_author_changed``."""
+        self._feed_author = {
+            name: self.__dict__[name]
+            for name in self.FEED_AUTHOR_FIELDS
+            if name in self.__dict__
+        }
+
+    def feed_author_changed(self):
+        """Whether a feed-rendered field may differ from the last snapshot."""
+        loaded = getattr(self, "_feed_author", {})
+        return any(
+            name not in loaded or loaded[name] != self.__dict__.get(name)
+            for name in self.FEED_AUTHOR_FIELDS
+        )
     
     
     
@@ -77,6 +122,9 @@ class Feed(models.Model):
     )
     text = models.TextField(max_length=1000, blank=True, null=True)
     image = models.ImageField(upload_to="feeds/", blank=True, null=True)
+    # Storage names of the resized, metadata-free copies of ``image``, keyed by
+    # variant name; filled in by the background image pipeline.
+    image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(
@@ -84,10 +132,117 @@ class Feed(models.Model):
         related_name="liked_feeds",
         blank=True
     )
+    # Denormalized count of ``likes``; kept in step by FeedLikeAPIView and
+    # repairable with ``manage.py repair_like_counts``.
+    likes_count = models.PositiveIntegerField(default=0)
+    # Set when the author had too many followers to fan this post out;
+    # timeline reads merge such posts in from this table instead.
+    pulled = models.BooleanField(default=False)
 
     class Meta:
         db_table = "feed"
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="feed_created_id_idx"),
+            # Serves the per-author range reads of pulled posts in timelines.
+            models.Index(
+                fields=["user", "-id"],
+                condition=models.Q(pulled=True),
+                name="feed_pulled_user_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Feed by {self.user.email} - {(self.text or '')[:30]}"
+
+
+class Follow(models.Model):
+    """A user following a teacher's posts."""
+
+    follower = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="following",
+    )
+    followee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="followers",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "follow"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "followee"], name="follow_unique_pair"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followee_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    One feed id in a user's materialized timeline, written at post time.
+
+    The ``(owner, feed)`` unique index doubles as the range index for timeline
+    reads (``owner = ? AND feed_id < ? ORDER BY feed_id DESC``).
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    feed = models.ForeignKey(
+        Feed,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+
+    class Meta:
+        db_table = "timeline_entry"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "feed"], name="timeline_owner_feed_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Timeline of {self.owner_id}: feed {self.feed_id}"
+
+
+class ImageJob(models.Model):
+    """A queued request to build the image variants of one feed."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="image_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Set once the original has been rewritten without metadata, so retries
+    # only rebuild the variants.
+    original_stripped = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "image_job"
+        indexes = [
+            models.Index(fields=["status", "id"], name="image_job_status_idx"),
+        ]
 
     def __str__(self):
-        return f"Feed by {self.user.email} - {self.text[:30]}"    
+        return f"Image job {self.pk} for feed {self.feed_id} ({self.status})"
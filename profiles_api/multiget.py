@@ -0,0 +1,37 @@
+"""``GET /api/profile/?ids=1,2,3``: several profiles in one ``IN`` query."""
+
+from django.conf import settings
+
+from .models import User
+from .read_serializers import user_reader
+
+
+def parse_ids(raw):
+    """
+    Distinct ids from a comma-separated list, in the order given. Raises
+    ``ValueError`` with a client-facing message.
+    """
+    limit = settings.PROFILE_MULTI_GET_MAX
+    ids = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdecimal():
+            raise ValueError(f"Invalid id: {part!r}.")
+        ids[int(part)] = None
+        if len(ids) > limit:
+            raise ValueError(f"At most {limit} ids can be requested at once.")
+    if not ids:
+        raise ValueError("Provide at least one id.")
+    return list(ids)
+
+
+def users_by_ids(ids, reader=user_reader):
+    """``.values()`` rows for ``ids``; unknown ids are left out."""
+    return reader.values(User.objects.filter(pk__in=ids), "id")
+
+
+def in_request_order(rows, ids):
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[pk] for pk in ids if pk in by_id]
@@ -0,0 +1,128 @@
+"""Keyset (cursor) pagination for the profiles API list endpoints."""
+
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class FeedCursorPagination(BasePagination):
+    """
+    Seek pagination over ``(-created_at, -id)``.
+
+    Each page is fetched with a ``WHERE (created_at, id) < (cursor)`` filter
+    backed by the composite ``feed_created_id_idx`` index, so page 1000 costs
+    the same as page 1. The cursor is an opaque base64 token.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor."
+
+    def __init__(self):
+        self.page_size = getattr(settings, "FEED_PAGE_SIZE", 20)
+        self.max_page_size = getattr(settings, "FEED_MAX_PAGE_SIZE", 100)
+        self.request = None
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        """Return the requested page size, clamped to ``max_page_size``."""
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    @staticmethod
+    def encode_cursor(created_at, pk):
+        raw = f"{created_at.isoformat()}|{pk}".encode("ascii")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, token):
+        """Return ``(created_at, id)`` for a cursor token or raise ``NotFound``."""
+        try:
+            raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("ascii")
+            created_raw, pk_raw = raw.rsplit("|", 1)
+            created_at = parse_datetime(created_raw)
+            pk = int(pk_raw)
+        except (binascii.Error, UnicodeError, ValueError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        token = request.GET.get(self.cursor_query_param)
+        if token:
+            created_at, pk = self.decode_cursor(token)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Fetch one extra row to learn whether a next page exists.
+        return page_size, queryset.order_by("-created_at", "-id")[: page_size + 1]
+
+    def _finish_page(self, rows, page_size):
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            if isinstance(last, dict):
+                self.next_cursor = self.encode_cursor(last["created_at"], last["id"])
+            else:
+                self.next_cursor = self.encode_cursor(last.created_at, last.id)
+        else:
+            self.next_cursor = None
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size, queryset = self._page_queryset(queryset, request)
+        return self._finish_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, using async iteration."""
+        page_size, queryset = self._page_queryset(queryset, request)
+        return self._finish_page([row async for row in queryset], page_size)
+
+    def cache_variant(self, request):
+        """Key part identifying the page ``request`` asks for."""
+        token = request.GET.get(self.cursor_query_param, "")
+        return f"{self.get_page_size(request)}:{token}"
+
+    def restore(self, request, next_cursor):
+        """Prepare to render a page fetched earlier by ``paginate_queryset``."""
+        self.request = request
+        self.next_cursor = next_cursor
+
+    def get_paginated_data(self, data):
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
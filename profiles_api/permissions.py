@@ -0,0 +1,14 @@
+"""Custom DRF permission classes for the profiles API app."""
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsLocalRequest(BasePermission):
+    """Allow only requests from loopback or ``INTERNAL_IPS`` addresses."""
+
+    LOOPBACK = ("127.0.0.1", "::1")
+
+    def has_permission(self, request, view):
+        remote_addr = request.META.get("REMOTE_ADDR")
+        return remote_addr in self.LOOPBACK or remote_addr in settings.INTERNAL_IPS
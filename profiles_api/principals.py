@@ -0,0 +1,257 @@
+"""Two-tier cache of authenticated ``User`` principals keyed on user id."""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from .cache_utils import incr_or_seed
+from .conf import app_settings
+from .models import User
+
+DEFAULTS = {
+    "TTL": 60,
+    "LOCAL_TTL": 5,
+    "MAX_SIZE": 1024,
+    "BACKEND": None,
+    "VERSION_CHECK": 0,
+    "KEY_PREFIX": "principal",
+    "INVALIDATE_GRACE": 10,
+}
+
+conf = app_settings("PRINCIPAL_CACHE", DEFAULTS)
+
+# Stored in the shared tier in place of a just-invalidated user.
+INVALIDATED = "invalidated"
+
+
+class PrincipalCache:
+    """
+    Cache users looked up by ``SimpleJWTAuthentication``.
+
+    The first tier is a per-process LRU with a TTL. The optional second tier is
+    a Django cache alias (``BACKEND``) shared by all workers. Entries are
+    dropped from both tiers by the ``User`` save/delete signals, which also
+    move the user's *version* in the shared tier. A local hit is only served
+    while that version is still the one it was read under, so a role change or
+    deactivation in one worker takes effect in all of them at once.
+
+    That check is a shared-cache ``get`` per local hit: one network round trip
+    instead of a query, where a local hit alone would cost none. With
+    ``version_check`` seconds set, a local entry whose version was confirmed
+    that recently is served without asking again, so other workers' changes
+    may take up to ``version_check`` seconds to apply.
+
+    Without a shared tier nothing tells one process about another's writes.
+    The local tier is then on only if ``local_ttl`` is set, and a change made
+    in one worker reaches the others' entries when they expire, so keep it
+    short. The process that made the change drops its entry at once.
+
+    A lookup that read the database before an invalidation must not cache what
+    it read. Locally, ``_generation`` moves on every invalidation and a store
+    from an older generation is dropped; the version it stores was read before
+    the database, so other processes drop it too. In the shared tier an
+    ``INVALIDATED`` marker stays for ``invalidate_grace`` seconds and lookups
+    store with ``add``, which fails while it is there.
+    """
+
+    def __init__(self, ttl=60, local_ttl=None, max_size=1024, backend=None,
+                 key_prefix="principal", invalidate_grace=10, version_check=0):
+        self.ttl = ttl
+        self._local_ttl = local_ttl
+        self.version_check = version_check
+        self.max_size = max_size
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.invalidate_grace = invalidate_grace
+        self._local = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        principals = cls()
+        principals.load_settings()
+        return principals
+
+    def load_settings(self):
+        """(Re)read ``PRINCIPAL_CACHE`` and start from an empty local tier."""
+        self.ttl = conf("TTL")
+        self._local_ttl = conf("LOCAL_TTL")
+        self.max_size = conf("MAX_SIZE")
+        self.backend = conf("BACKEND")
+        self.key_prefix = conf("KEY_PREFIX")
+        self.invalidate_grace = conf("INVALIDATE_GRACE")
+        self.version_check = conf("VERSION_CHECK")
+        self.clear()
+
+    @property
+    def shared(self):
+        return caches[self.backend] if self.backend else None
+
+    @property
+    def local_ttl(self):
+        if self._local_ttl is not None:
+            return self._local_ttl
+        return self.ttl if self.backend else 0
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}:{user_id}"
+
+    def _version_key(self, user_id):
+        return f"{self.key_prefix}:{user_id}:version"
+
+    def _get_local(self, user_id, now):
+        """
+        The live ``(user, expires, version, checked_until)`` entry for
+        ``user_id``, if any.
+        """
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return entry
+
+    def _local_hit(self, user_id, entry, version, now):
+        """``entry``'s user if ``version`` (read from the shared tier) still matches."""
+        with self._lock:
+            current = self._local.get(user_id) is entry
+            if entry[2] != version:
+                if current:
+                    del self._local[user_id]
+                return None
+            if current and self.version_check > 0:
+                self._local[user_id] = entry[:3] + (now + self.version_check,)
+        self._count("local_hits")
+        return entry[0]
+
+    def _fresh_local_hit(self, entry, shared, now):
+        """``entry``'s user if its version need not be checked again yet."""
+        if shared is not None and entry[3] <= now:
+            return None
+        self._count("local_hits")
+        return entry[0]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_user(self, user_id):
+        """Return the user for ``user_id`` or raise ``User.DoesNotExist``."""
+        now = time.monotonic()
+        shared = self.shared
+        entry = self._get_local(user_id, now)
+        if entry is not None:
+            user = self._fresh_local_hit(entry, shared, now)
+            if user is None:
+                version = shared.get(self._version_key(user_id))
+                user = self._local_hit(user_id, entry, version, now)
+            if user is not None:
+                return copy.copy(user)
+
+        generation = self._generation
+        user = version = None
+        if shared is not None:
+            found = shared.get_many([self._key(user_id), self._version_key(user_id)])
+            user = found.get(self._key(user_id))
+            version = found.get(self._version_key(user_id))
+        if isinstance(user, User):
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            user = User.objects.get(id=user_id)
+            if shared is not None and not shared.add(
+                self._key(user_id), user, self.ttl
+            ):
+                return user
+
+        self._store_local(user_id, user, now, generation, version)
+        return copy.copy(user)
+
+    async def aget_user(self, user_id):
+        """Async ``get_user`` using the async cache and ORM APIs."""
+        now = time.monotonic()
+        shared = self.shared
+        entry = self._get_local(user_id, now)
+        if entry is not None:
+            user = self._fresh_local_hit(entry, shared, now)
+            if user is None:
+                version = await shared.aget(self._version_key(user_id))
+                user = self._local_hit(user_id, entry, version, now)
+            if user is not None:
+                return copy.copy(user)
+
+        generation = self._generation
+        user = version = None
+        if shared is not None:
+            found = await shared.aget_many(
+                [self._key(user_id), self._version_key(user_id)]
+            )
+            user = found.get(self._key(user_id))
+            version = found.get(self._version_key(user_id))
+        if isinstance(user, User):
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            user = await User.objects.aget(id=user_id)
+            if shared is not None and not await shared.aadd(
+                self._key(user_id), user, self.ttl
+            ):
+                return user
+
+        self._store_local(user_id, user, now, generation, version)
+        return copy.copy(user)
+
+    def _store_local(self, user_id, user, now, generation, version):
+        local_ttl = self.local_ttl
+        if self.max_size <= 0 or local_ttl <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while we read; what we read may be stale.
+                return
+            # A version read with the user counts as just checked.
+            self._local[user_id] = (
+                user, now + local_ttl, version, now + self.version_check
+            )
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._local.pop(user_id, None)
+        shared = self.shared
+        if shared is not None:
+            shared.set(self._key(user_id), INVALIDATED, self.invalidate_grace)
+            incr_or_seed(shared, self._version_key(user_id))
+
+    def clear(self):
+        """Drop the local tier and reset the counters."""
+        with self._lock:
+            self._local.clear()
+            self.local_hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "size": len(self._local),
+                "max_size": self.max_size,
+            }
+
+
+principal_cache = PrincipalCache.from_settings()
+conf.on_change(principal_cache.load_settings)
@@ -0,0 +1,189 @@
+"""
+Primary/replica database routing with read-your-writes pinning.
+
+``PrimaryReplicaRouter`` sends writes to ``default`` and reads to one of the
+``READ_REPLICAS["ALIASES"]`` (none configured means everything stays on
+``default``). Reads go to the primary instead when
+
+* they run inside a transaction on the primary,
+* the current request is itself a write (POST/PUT/PATCH/DELETE), or
+* the client wrote something in the last ``PIN_SECONDS``, so their new post or
+  like is visible on the very next request even if the replicas lag.
+
+Pins are kept in a cache (``CACHE_ALIAS``) under the writer's user id or, for
+anonymous writes such as registration, their client address. The next request
+may land on any worker, so the cache must be shared by all of them: with
+replicas configured, a per-process alias (LocMem) raises
+``ImproperlyConfigured``. The user id is
+only known once the bearer token has been decoded, so
+``SimpleJWTAuthentication`` reports it through ``identify`` before loading the
+user.
+
+The request state lives in a context variable, so it follows a request into
+``sync_to_async`` threads. Background work outside a request can use
+``use_primary()``.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache_utils import is_process_local
+from .conf import app_settings
+
+DEFAULTS = {
+    "ALIASES": [],
+    "PIN_SECONDS": 5,
+    "CACHE_ALIAS": "default",
+    "KEY_PREFIX": "replica-pin",
+}
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_pinned = ContextVar("replica_pinned", default=False)
+_identity = ContextVar("replica_identity", default=None)
+
+
+conf = app_settings("READ_REPLICAS", DEFAULTS)
+
+
+def _pin_key(identity):
+    return f"{conf('KEY_PREFIX')}:{identity}"
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary():
+    """Send every read in the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def identify(user_id):
+    """Note the authenticated user; pins the request if they wrote recently."""
+    if not conf("ALIASES"):
+        return
+    identity = f"user:{user_id}"
+    _identity.set(identity)
+    if not _pinned.get() and caches[conf("CACHE_ALIAS")].get(_pin_key(identity)):
+        _pinned.set(True)
+
+
+async def aidentify(user_id):
+    """``identify`` for async views."""
+    if not conf("ALIASES"):
+        return
+    identity = f"user:{user_id}"
+    _identity.set(identity)
+    if not _pinned.get() and await caches[conf("CACHE_ALIAS")].aget(_pin_key(identity)):
+        _pinned.set(True)
+
+
+def _pins(identities):
+    return {_pin_key(identity): True for identity in identities}
+
+
+def pin_identities(identities):
+    caches[conf("CACHE_ALIAS")].set_many(_pins(identities), conf("PIN_SECONDS"))
+
+
+async def apin_identities(identities):
+    await caches[conf("CACHE_ALIAS")].aset_many(_pins(identities), conf("PIN_SECONDS"))
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = conf("ALIASES")
+        if not replicas or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication.
+        return db not in conf("ALIASES")
+
+
+class ReplicaPinningMiddleware:
+    """
+    Tracks the read-your-writes state of each request for the router. Runs
+    natively under both WSGI and ASGI, and drops out of the stack entirely
+    when no replicas are configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not conf("ALIASES"):
+            raise MiddlewareNotUsed
+        alias = conf("CACHE_ALIAS")
+        if is_process_local(caches[alias]):
+            raise ImproperlyConfigured(
+                f"READ_REPLICAS['CACHE_ALIAS'] ({alias!r}) is local to each "
+                "process, so a write pins reads only on the worker that served "
+                "it. Point it at a cache shared by all workers."
+            )
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _client(request):
+        return f"addr:{request.META.get('REMOTE_ADDR', '')}"
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        client = self._client(request)
+        writing = request.method not in SAFE_METHODS
+        pinned = writing or bool(caches[conf("CACHE_ALIAS")].get(_pin_key(client)))
+        pinned_token = _pinned.set(pinned)
+        identity_token = _identity.set(None)
+        try:
+            response = self.get_response(request)
+            if writing and response.status_code < 400:
+                # Anonymous writers (registration) are pinned by address.
+                pin_identities([_identity.get() or client])
+            return response
+        finally:
+            _pinned.reset(pinned_token)
+            _identity.reset(identity_token)
+
+    async def __acall__(self, request):
+        client = self._client(request)
+        writing = request.method not in SAFE_METHODS
+        pinned = writing or bool(
+            await caches[conf("CACHE_ALIAS")].aget(_pin_key(client))
+        )
+        pinned_token = _pinned.set(pinned)
+        identity_token = _identity.set(None)
+        try:
+            response = await self.get_response(request)
+            if writing and response.status_code < 400:
+                await apin_identities([_identity.get() or client])
+            return response
+        finally:
+            _pinned.reset(pinned_token)
+            _identity.reset(identity_token)
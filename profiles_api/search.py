@@ -0,0 +1,78 @@
+"""Indexed, ranked user search used by ``UserRegisterAPIView.get``."""
+
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import User
+
+FTS_TABLE = "user_search"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_fts_tables = {}
+
+
+def _terms(query):
+    return _TERM_RE.findall(query.lower())
+
+
+def _fts_available(connection):
+    """Whether the FTS5 table exists; looked up once per database file."""
+    name = str(connection.settings_dict["NAME"])
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def _search_sqlite(connection, query, limit):
+    """Prefix-match every term against the FTS5 index, best bm25 rank first."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            "ORDER BY rank LIMIT %s",
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    users = User.objects.using(connection.alias).in_bulk(ids)
+    return [users[pk] for pk in ids if pk in users]
+
+
+def _search_postgresql(connection, query, limit):
+    """``icontains`` served by the trigram GIN indexes, ranked by similarity."""
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models.functions import Greatest
+
+    return list(
+        User.objects.using(connection.alias)
+        .filter(Q(name__icontains=query) | Q(email__icontains=query))
+        .annotate(
+            similarity=Greatest(
+                TrigramSimilarity("name", query), TrigramSimilarity("email", query)
+            )
+        )
+        .order_by("-similarity", "pk")[:limit]
+    )
+
+
+def search_users(query, limit):
+    """
+    Return at most ``limit`` users matching ``query``, best match first. The
+    raw FTS query runs on the database the router picks for ``User`` reads,
+    like the ORM queries around it.
+    """
+    connection = connections[router.db_for_read(User)]
+    if connection.vendor == "sqlite" and _fts_available(connection):
+        return _search_sqlite(connection, query, limit)
+    if connection.vendor == "postgresql":
+        return _search_postgresql(connection, query, limit)
+    return list(
+        User.objects.using(connection.alias).filter(
+            Q(name__icontains=query) | Q(email__icontains=query)
+        ).order_by("pk")[:limit]
+    )
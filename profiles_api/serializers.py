@@ -1,20 +1,61 @@
+import re
+
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from .models import User, Feed
 
+EMAIL_TAKEN = "This email is already registered."
+
+
+# How each backend names the unique indexes on user.email in its error: the
+# case-insensitive constraint, then the column's own index (SQLite reports it
+# as table.column, PostgreSQL as <table>_<column>_key).
+EMAIL_UNIQUE_INDEXES = (
+    "user_email_ci_unique",
+    f"{User._meta.db_table}.email",
+    f"{User._meta.db_table}_email_key",
+)
+
+
+def is_email_conflict(exc):
+    """Whether ``exc`` came from one of the unique indexes on ``user.email``."""
+    diag = getattr(exc.__cause__, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint is not None:
+        return constraint in EMAIL_UNIQUE_INDEXES
+    message = str(exc)
+    return any(
+        re.search(rf"\b{re.escape(name)}\b", message) for name in EMAIL_UNIQUE_INDEXES
+    )
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "email", "name", "password", "role"]
-        extra_kwargs = {"password": {"write_only": True}}
+        extra_kwargs = {
+            "password": {"write_only": True},
+            # Uniqueness is enforced by the user_email_ci_unique index; see save.
+            "email": {"validators": []},
+        }
 
     def validate_email(self, value):
-        """Check if email is unique and valid format."""
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("This email is already registered.")
+        """Check the email format and normalize its domain."""
         if "@" not in value or "." not in value:
             raise serializers.ValidationError("Enter a valid email address.")
-        return value
+        return User.objects.normalize_email(value)
+
+    def save(self, **kwargs):
+        # No exists() pre-check: it costs a query, races with concurrent
+        # signups and cannot tell an unchanged email from a taken one. The
+        # savepoint keeps a conflict from breaking an enclosing transaction.
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            if is_email_conflict(exc):
+                raise serializers.ValidationError({"email": [EMAIL_TAKEN]})
+            raise
 
     def validate_name(self, value):
         """Ensure name is not empty and has at least 3 characters."""
@@ -39,11 +80,40 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-# ✅ Optimized FeedSerializer (works with annotate)
+class ImageVariantsField(serializers.Field):
+    """Render ``Feed.image_variants`` storage names as URLs."""
+
+    # to_representation depends only on the column value, so the compiled read
+    # path in read_serializers can call it directly on .values() rows.
+    values_safe = True
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("read_only", True)
+        super().__init__(**kwargs)
+        self.storage = Feed._meta.get_field("image").storage
+
+    def to_representation(self, value):
+        return {name: self.storage.url(path) for name, path in value.items()}
+
+
+class ImageVariantField(ImageVariantsField):
+    """URL of a single image variant, or ``None`` until it has been built."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        path = value.get(self.variant)
+        return self.storage.url(path) if path else None
+
+
+# ✅ Optimized FeedSerializer (likes_count stored column se aata hai)
 class FeedSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source="user.name", read_only=True)
     user_email = serializers.CharField(source="user.email", read_only=True)
-    likes_count = serializers.IntegerField(read_only=True)  # runtime nahi, DB annotate se aayega
+    thumbnail = ImageVariantField("thumb", source="image_variants")
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Feed
@@ -54,7 +124,9 @@ class FeedSerializer(serializers.ModelSerializer):
             "user_email",
             "text",
             "image",
+            "thumbnail",
+            "image_variants",
             "created_at",
             "likes_count",
         ]
-        read_only_fields = ["user", "created_at"]
+        read_only_fields = ["user", "created_at", "likes_count"]
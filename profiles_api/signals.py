@@ -0,0 +1,56 @@
+"""Signal handlers for the profiles API app."""
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .feed_cache import feed_page_cache
+from .models import Feed, User
+from .principals import principal_cache
+from . import metrics, sqlite_tuning
+
+FEED_AUTHOR_FIELDS = set(User.FEED_AUTHOR_FIELDS)
+
+
+@receiver(post_save, sender=User, dispatch_uid="principal_cache_user_saved")
+@receiver(post_delete, sender=User, dispatch_uid="principal_cache_user_deleted")
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Drop a user from the principal cache whenever the row changes."""
+    principal_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User, dispatch_uid="feed_author_saved")
+def touch_authored_feeds(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Stamp the user's feeds as modified when their name or email changed, so
+    the feed list's conditional GET validators move. Saves that leave both
+    as they were loaded (role, password, last_login) touch nothing.
+    """
+    if update_fields is not None and not FEED_AUTHOR_FIELDS & set(update_fields):
+        return
+    changed = instance.feed_author_changed()
+    instance.snapshot_feed_author()
+    if created or not changed:
+        return
+    if Feed.objects.filter(user=instance).update(updated_at=timezone.now()):
+        feed_page_cache.bump()
+
+
+@receiver(post_save, sender=Feed, dispatch_uid="feed_page_cache_feed_saved")
+@receiver(post_delete, sender=Feed, dispatch_uid="feed_page_cache_feed_deleted")
+def invalidate_feed_pages(sender, instance, **kwargs):
+    """Any feed create, edit or delete makes the cached feed pages stale."""
+    feed_page_cache.bump()
+
+
+@receiver(connection_created, dispatch_uid="sqlite_tuning")
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Apply the ``SQLITE_TUNING`` pragmas to each new SQLite connection."""
+    sqlite_tuning.apply(connection)
+
+
+@receiver(connection_created, dispatch_uid="request_metrics")
+def time_connection_queries(sender, connection, **kwargs):
+    """Let ``RequestMetricsMiddleware`` see the queries of every connection."""
+    metrics.install(connection)
@@ -0,0 +1,86 @@
+"""
+Per-connection tuning for SQLite deployments.
+
+``apply`` runs from the ``connection_created`` signal on every new SQLite
+connection and sets the ``SQLITE_TUNING`` profile:
+
+* WAL journal, so readers no longer block the writer (and vice versa), with
+  ``synchronous=NORMAL``, which is durable against application crashes and
+  only risks the last commits on power loss;
+* a busy timeout, so a writer waits for the lock instead of failing;
+* ``BEGIN IMMEDIATE`` for ``atomic()`` blocks, so a transaction takes the
+  write lock up front. A deferred transaction that reads and then writes
+  cannot wait for the lock and fails at once with "database is locked";
+* a larger page cache and memory-mapped reads.
+
+``journal_mode`` is stored in the database file itself, so it is only set
+by the server entry points (``profiles_project/wsgi.py`` and ``asgi.py``, which
+``runserver`` loads too) through ``serve_persistent_pragmas``. Tests and other
+management commands leave the committed ``db.sqlite3`` as it is.
+
+Persistent connections are set with ``CONN_MAX_AGE`` in ``DATABASES``; with
+them the pragmas are paid once per connection rather than once per request.
+"""
+
+from .conf import app_settings
+
+DEFAULTS = {
+    "ENABLED": True,
+    "JOURNAL_MODE": "WAL",
+    "SYNCHRONOUS": "NORMAL",
+    "BUSY_TIMEOUT": 5000,
+    "CACHE_SIZE": -20000,
+    "MMAP_SIZE": 128 * 1024 * 1024,
+    "TEMP_STORE": "MEMORY",
+    "TRANSACTION_MODE": "IMMEDIATE",
+}
+
+PRAGMAS = {
+    "JOURNAL_MODE": "journal_mode",
+    "SYNCHRONOUS": "synchronous",
+    "BUSY_TIMEOUT": "busy_timeout",
+    "CACHE_SIZE": "cache_size",
+    "MMAP_SIZE": "mmap_size",
+    "TEMP_STORE": "temp_store",
+}
+
+# Pragmas written into the database file rather than kept per connection.
+PERSISTENT = {"JOURNAL_MODE"}
+
+_serving = False
+
+conf = app_settings("SQLITE_TUNING", DEFAULTS)
+
+
+def serve_persistent_pragmas():
+    """Also set the ``PERSISTENT`` pragmas on connections opened from now on."""
+    global _serving  # pylint: disable=global-statement
+    _serving = True
+
+
+def get_profile():
+    return {key: conf(key) for key in DEFAULTS}
+
+
+def apply(connection, profile=None, persistent=None):
+    """
+    Set the tuning pragmas on a freshly opened SQLite ``connection``. The
+    ``PERSISTENT`` ones are skipped unless ``persistent`` is true (by default,
+    unless ``serve_persistent_pragmas`` was called).
+    """
+    profile = get_profile() if profile is None else profile
+    persistent = _serving if persistent is None else persistent
+    if connection.vendor != "sqlite" or not profile["ENABLED"]:
+        return
+
+    with connection.cursor() as cursor:
+        for key, pragma in PRAGMAS.items():
+            value = profile[key]
+            if key in PERSISTENT and not persistent:
+                continue
+            if value is not None:
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    if profile["TRANSACTION_MODE"]:
+        # Read by DatabaseWrapper._start_transaction_under_autocommit.
+        connection.transaction_mode = profile["TRANSACTION_MODE"].upper()
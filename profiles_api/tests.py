@@ -1 +1,1605 @@
 """Test suite for the profiles API app."""
+
+import base64
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import jwt
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from .authentication import SimpleJWTAuthentication, VerifiedTokenMemo, token_memo
+from .checks import check_login_throttle_cache
+from .events import LocalBackend, get_broadcaster
+from .feed_cache import FeedPageCache, LocalStore, feed_page_cache
+from .hashing import HashingPoolBusy, hashing_pool
+from .like_buffer import _insert_likes, like_buffer
+from .likes import toggle_like
+from . import benchmarking, images, routing, sqlite_tuning, timeline
+from .metrics import RequestMetricsMiddleware, registry
+from .models import Feed, ImageJob, TimelineEntry, User
+from .principals import INVALIDATED, PrincipalCache, principal_cache
+from .read_serializers import feed_reader, user_reader
+from .routing import PrimaryReplicaRouter, ReplicaPinningMiddleware
+from .search import search_users
+from .serializers import (
+    EMAIL_TAKEN,
+    FeedSerializer,
+    UserSerializer,
+    is_email_conflict,
+)
+
+
+class AsyncURLConf:
+    """``ROOT_URLCONF`` serving the async views whatever ``ASYNC_API`` says."""
+
+    urlpatterns = [path("api/", include("profiles_api.async_urls"))]
+
+
+class CompiledReadSerializerParityTests(TestCase):
+    """The compiled read path must render exactly what the DRF serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        cls.student = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+        Feed.objects.create(user=cls.teacher, text="plain text post")
+        Feed.objects.create(user=cls.teacher, text=None)
+        Feed.objects.create(user=cls.teacher, text="with image", image="feeds/a.png")
+        Feed.objects.create(user=cls.teacher, text="", image="", likes_count=7)
+        Feed.objects.create(
+            user=cls.teacher,
+            image="feeds/b.png",
+            image_variants={"thumb": "feeds/b_thumb.webp"},
+        )
+
+    def assert_feed_parity(self):
+        feeds = Feed.objects.order_by("-created_at", "-id")
+        expected = FeedSerializer(feeds, many=True).data
+        actual = feed_reader.many(feed_reader.values(feeds))
+        self.assertEqual(actual, [dict(row) for row in expected])
+
+    def test_feed_parity(self):
+        self.assert_feed_parity()
+
+    @override_settings(TIME_ZONE="Asia/Karachi")
+    def test_feed_parity_non_utc_timezone(self):
+        self.assert_feed_parity()
+
+    def test_user_parity(self):
+        users = User.objects.order_by("pk")
+        expected = UserSerializer(users, many=True).data
+        actual = user_reader.many(user_reader.values(users))
+        self.assertEqual(actual, [dict(row) for row in expected])
+        self.assertNotIn("password", actual[0])
+
+    def test_feed_values_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            feed_reader.many(feed_reader.values(Feed.objects.all()))
+
+    def test_sparse_fieldset_is_pushed_into_the_select(self):
+        feed_page_cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/feeds/", {"fields": "likes_count,liked_by_me"})
+        self.assertEqual(
+            set(response.data["results"][0]), {"likes_count", "liked_by_me"}
+        )
+        page_sql = next(q["sql"] for q in queries if "ORDER BY" in q["sql"])
+        self.assertNotIn('"text"', page_sql)
+        self.assertNotIn("JOIN", page_sql)
+
+        response = client.get("/api/feeds/", {"fields": "likes_count,password"})
+        self.assertEqual(response.status_code, 400)
+
+
+class FeedCursorPaginationTests(TestCase):
+    def setUp(self):
+        feed_page_cache.clear()
+        teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(teacher)
+        feeds = [Feed.objects.create(user=teacher, text=f"post {n}") for n in range(8)]
+        # Most posts share one timestamp, so only the id breaks the ties.
+        tied = timezone.now()
+        Feed.objects.filter(pk__in=[feed.pk for feed in feeds[1:7]]).update(
+            created_at=tied
+        )
+        self.expected = list(
+            Feed.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def test_walking_next_links_over_tied_timestamps(self):
+        seen = []
+        url = f"{reverse('feeds')}?page_size=3"
+        while url:
+            page = self.client.get(url).data
+            self.assertLessEqual(len(page["results"]), 3)
+            seen += [row["id"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, self.expected)
+
+    def test_bad_or_tampered_cursors_are_404(self):
+        def encode(raw):
+            return base64.urlsafe_b64encode(raw.encode()).decode()
+
+        for cursor in (
+            "not base64!",
+            encode("no separator"),
+            encode("2024-01-01T00:00:00+00:00|seven"),
+            encode("yesterday|7"),
+            "é",
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse("feeds"), {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class StreamingListTests(TestCase):
+    def setUp(self):
+        feed_page_cache.clear()
+        teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        for number in range(5):
+            Feed.objects.create(user=teacher, text=f"post {number}")
+        self.client = APIClient()
+        self.client.force_authenticate(teacher)
+
+    def test_stream_param_sends_the_page_rows_as_a_json_array(self):
+        page = self.client.get(reverse("feeds")).data["results"]
+        response = self.client.get(reverse("feeds"), {"stream": "1"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            streamed, [{k: v for k, v in row.items() if k != "liked_by_me"} for row in page]
+        )
+
+    def test_ndjson_sends_one_user_per_line(self):
+        # The plain list is unordered; the stream goes in id order.
+        users = sorted(self.client.get(reverse("profile-method")).data, key=lambda u: u["id"])
+        for kwargs in (
+            {"HTTP_ACCEPT": "application/x-ndjson"},
+            {"data": {"format": "ndjson"}},
+        ):
+            with self.subTest(**kwargs):
+                response = self.client.get(reverse("profile-method"), **kwargs)
+                self.assertEqual(response["Content-Type"], "application/x-ndjson")
+                lines = b"".join(response.streaming_content).decode().splitlines()
+                self.assertEqual([json.loads(line) for line in lines], users)
+
+
+class FeedListQueryCountTests(TestCase):
+    """Guard against N+1 author lookups on the feed list and admin."""
+
+    # The page itself, then the caller's likes on that page.
+    FEED_LIST_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        cls.student = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+        cls.admin = User.objects.create_superuser(
+            "admin@example.com", "Admin One", "secret1"
+        )
+
+    def make_feeds(self, count):
+        other = User.objects.create_user(
+            f"teacher{count}@example.com", "Teacher Two", "secret1", role="teacher"
+        )
+        Feed.objects.bulk_create(
+            Feed(user=self.teacher if i % 2 else other, text=f"post {i}")
+            for i in range(count)
+        )
+
+    def test_feed_list_query_count_is_constant(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        for count in (1, 30):
+            Feed.objects.all().delete()
+            feed_page_cache.clear()
+            self.make_feeds(count)
+            with self.assertNumQueries(self.FEED_LIST_QUERIES):
+                response = client.get("/api/feeds/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), min(count, 20))
+
+    def test_admin_changelist_query_count_is_constant(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:profiles_api_feed_changelist")
+        self.make_feeds(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.make_feeds(20)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+
+class ImagePipelineTests(TestCase):
+    """Uploads are queued, then resized to metadata-free WebP variants."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+
+    def upload(self):
+        exif = Image.Exif()
+        exif[0x010F] = "Camera Maker"
+        exif[0x8825] = {1: "N", 2: (31.0, 30.0, 0.0)}  # GPS position
+        buffer = BytesIO()
+        Image.new("RGB", (1600, 900), "red").save(buffer, "JPEG", exif=exif)
+        return SimpleUploadedFile("photo.jpg", buffer.getvalue(), "image/jpeg")
+
+    def test_upload_is_processed_off_request(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = client.post(
+                "/api/feeds/",
+                {"text": "photo", "image": self.upload()},
+                format="multipart",
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertIsNone(response.data["thumbnail"])
+            self.assertEqual(ImageJob.objects.get().status, ImageJob.PENDING)
+            uploaded = Feed.objects.get().image.name
+            with Feed.objects.get().image.open("rb") as original:
+                # Stored as uploaded: the request does no image work.
+                self.assertTrue(Image.open(original).getexif())
+
+            call_command("process_images", once=True, stdout=StringIO())
+
+            feed = Feed.objects.get()
+            self.assertEqual(ImageJob.objects.get().status, ImageJob.DONE)
+            self.assertNotEqual(feed.image.name, uploaded)
+            self.assertFalse(feed.image.storage.exists(uploaded))
+            with feed.image.open("rb") as original:
+                self.assertFalse(Image.open(original).getexif())
+            self.assertEqual(set(feed.image_variants), {"thumb", "medium"})
+            with feed.image.storage.open(feed.image_variants["thumb"]) as thumb:
+                image = Image.open(thumb)
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(max(image.size), 320)
+                self.assertFalse(image.getexif())
+
+            listed = client.get("/api/feeds/").data["results"][0]
+            self.assertTrue(listed["thumbnail"].endswith("_thumb.webp"))
+
+    def test_in_process_worker_retries_and_recovers_stale_jobs(self):
+        failing = Feed.objects.create(user=self.teacher, text="a", image="feeds/a.png")
+        orphan = Feed.objects.create(user=self.teacher, text="b", image="feeds/b.png")
+        retried = ImageJob.objects.create(feed=failing)
+        stale = ImageJob.objects.create(
+            feed=orphan,
+            status=ImageJob.RUNNING,
+            attempts=1,
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+        build = mock.patch(
+            "profiles_api.images.build_variants",
+            side_effect=[OSError("storage hiccup"), {"thumb": "a.webp"}, {}],
+        )
+        strip = mock.patch("profiles_api.images.strip_original")
+        with build, strip as strip_original:
+            with mock.patch("profiles_api.images.close_old_connections"):
+                with self.assertLogs("profiles_api.images", "ERROR"):
+                    images._run_in_thread(retried.pk)
+
+        retried.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (ImageJob.DONE, 2))
+        self.assertEqual((stale.status, stale.attempts), (ImageJob.DONE, 2))
+        # The retry only rebuilds the variants; each original is stripped once.
+        self.assertEqual(
+            [call.args[0] for call in strip_original.call_args_list], [failing, orphan]
+        )
+
+    def test_stale_job_out_of_attempts_is_failed(self):
+        feed = Feed.objects.create(user=self.teacher, text="a", image="feeds/a.png")
+        job = ImageJob.objects.create(
+            feed=feed,
+            status=ImageJob.RUNNING,
+            attempts=images.conf("MAX_ATTEMPTS"),
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+
+        # A worker killed on every try (say, out of memory) must not cycle
+        # the job between running and pending forever.
+        self.assertEqual(images.release_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertFalse(images.claim(job.pk))
+
+
+@override_settings(
+    LOGIN_THROTTLE={
+        "CACHE_ALIAS": "default",
+        "ip": {"RATE": "100/min", "BURST": 100},
+        "email": {"RATE": "1/min", "BURST": 2},
+    }
+)
+class LoginThrottleTests(TestCase):
+    """Login attempts are rate limited before any password is hashed."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+
+    def login(self, email, password):
+        return APIClient().post(
+            "/api/login/", {"email": email, "password": password}, format="json"
+        )
+
+    def test_unknown_email_is_rejected_like_a_bad_password(self):
+        unknown = self.login("nobody@example.com", "secret1")
+        wrong = self.login("student@example.com", "wrong12")
+        self.assertEqual(unknown.status_code, 401)
+        self.assertEqual(unknown.data, wrong.data)
+
+    def test_email_bucket_throttles_and_skips_hashing(self):
+        self.assertEqual(self.login("Student@example.com", "wrong12").status_code, 401)
+        self.assertEqual(self.login("student@example.com", "secret1").status_code, 200)
+        with mock.patch.object(hashing_pool, "verify") as verify:
+            response = self.login("student@example.com", "secret1")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        verify.assert_not_called()
+
+    def test_deploy_check_warns_about_a_per_process_cache(self):
+        self.assertEqual(
+            [message.id for message in check_login_throttle_cache(None)],
+            ["profiles_api.W001"],
+        )
+        shared = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(),
+        }
+        self.addCleanup(shutil.rmtree, shared["LOCATION"], ignore_errors=True)
+        with self.settings(
+            CACHES={**settings.CACHES, "shared": shared},
+            LOGIN_THROTTLE={"CACHE_ALIAS": "shared"},
+        ):
+            self.assertEqual(check_login_throttle_cache(None), [])
+
+    def test_override_settings_resizes_the_hashing_pool(self):
+        with self.settings(LOGIN_HASHING={"MAX_PENDING": 1, "TIMEOUT": 3}):
+            self.assertEqual(hashing_pool.timeout, 3)
+            self.assertTrue(hashing_pool.verify("secret1", make_password("secret1")))
+        self.assertEqual(hashing_pool.timeout, 10)
+
+    def test_saturated_pool_returns_503(self):
+        with mock.patch.object(hashing_pool, "verify", side_effect=HashingPoolBusy):
+            response = self.login("student@example.com", "secret1")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class EmailUniquenessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+        self.client = APIClient()
+
+    def test_duplicate_in_other_case_is_a_400_without_a_pre_check(self):
+        data = {
+            "email": "Student@Example.COM",
+            "name": "Student Two",
+            "password": "secret2",
+            "role": "student",
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("profile-method"), data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"email": [EMAIL_TAKEN]})
+        self.assertFalse(any(q["sql"].startswith("SELECT") for q in queries))
+
+    def test_unchanged_email_update_and_login_ignore_case(self):
+        response = self.client.post(
+            reverse("user-login"),
+            {"email": "STUDENT@example.com", "password": "secret1"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+        response = self.client.put(
+            reverse("profile-details", args=[self.user.pk]),
+            {
+                "email": "student@example.com",
+                "name": "Student Renamed",
+                "password": "secret1",
+                "role": "student",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_email_index_violations_are_reported_as_taken(self):
+        taken = IntegrityError("UNIQUE constraint failed: index 'user_email_ci_unique'")
+        column = IntegrityError("UNIQUE constraint failed: user.email")
+        other = IntegrityError("UNIQUE constraint failed: user.email_backup")
+        self.assertTrue(is_email_conflict(taken))
+        self.assertTrue(is_email_conflict(column))
+        self.assertFalse(is_email_conflict(other))
+        self.assertFalse(is_email_conflict(IntegrityError("NOT NULL: user.name")))
+
+    def test_login_rejects_non_string_credentials(self):
+        for email in (["student@example.com"], {"a": 1}, 5):
+            response = self.client.post(
+                reverse("user-login"),
+                {"email": email, "password": "secret1"},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {"error": "Email and password are required."})
+
+    def test_lookup_uses_the_case_insensitive_index(self):
+        plan = str(User.objects.with_email("A@B.io").explain())
+        self.assertIn("user_email_ci_unique", plan)
+
+
+@override_settings(BULK_IMPORT={"BATCH_SIZE": 3, "HASH_WORKERS": 0})
+class BulkImportTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            "taken@example.com", "Taken User", "secret1", role="student"
+        )
+        User.objects.create_superuser("admin@example.com", "Admin", "secret1")
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("user-login"),
+            {"email": "admin@example.com", "password": "secret1"},
+            format="json",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+
+    def test_bad_rows_are_reported_without_aborting_the_batch(self):
+        body = (
+            "email,name,password,role\n"
+            "new1@example.com,New One,secret1,student\n"
+            "Taken@Example.com,Taken Again,secret1,student\n"
+            "not-an-email,Bad Email,secret1,student\n"
+            "new1@example.com,Duplicate,secret1,student\n"
+            "new2@example.com,New Two,short,teacher\n"
+            "new3@example.com,New Three,secret1,teacher\n"
+        )
+        upload = SimpleUploadedFile("users.csv", body.encode(), "text/csv")
+
+        # One email lookup per batch of three rows, however many rows it has.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("profile-import"), {"file": upload})
+        lookups = [q for q in queries if 'FROM "user"' in q["sql"] and " IN " in q["sql"]]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(
+            sorted(error["line"] for error in response.data["errors"]), [3, 4, 5, 6]
+        )
+        self.assertEqual(len(lookups), 2)
+        self.assertTrue(
+            User.objects.get(email="new3@example.com").check_password("secret1")
+        )
+
+    @override_settings(
+        BULK_IMPORT={"API_MAX_ROWS": 2, "API_HASH_WORKERS": 2, "HASH_WORKERS": 4}
+    )
+    def test_api_caps_rows_and_hashes_on_threads(self):
+        rows = [f"new{n}@example.com,New {n},secret1,student\n" for n in range(3)]
+        header = "email,name,password,role\n"
+
+        too_many = SimpleUploadedFile(
+            "users.csv", (header + "".join(rows)).encode(), "text/csv"
+        )
+        response = self.client.post(reverse("profile-import"), {"file": too_many})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(User.objects.filter(email="new0@example.com").exists())
+
+        upload = SimpleUploadedFile(
+            "users.csv", (header + "".join(rows[:2])).encode(), "text/csv"
+        )
+        with mock.patch("profiles_api.bulk_import.ProcessPoolExecutor") as processes:
+            response = self.client.post(reverse("profile-import"), {"file": upload})
+        processes.assert_not_called()
+        self.assertEqual(response.data["created"], 2)
+        self.assertTrue(
+            User.objects.get(email="new1@example.com").check_password("secret1")
+        )
+
+    def test_import_command_reads_ndjson(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = f"{tmpdir}/users.ndjson"
+        with open(path, "w", encoding="utf-8") as out:
+            out.write('{"email": "nd@example.com", "name": "Nd User", ')
+            out.write('"password": "secret1", "role": "student"}\n')
+            out.write("not json\n")
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_users", path, stdout=stdout, stderr=stderr)
+
+        self.assertIn("created 1, failed 1", stdout.getvalue())
+        self.assertIn("line 2", stderr.getvalue())
+        self.assertTrue(User.objects.filter(email="nd@example.com").exists())
+
+
+class VerifiedTokenMemoTests(SimpleTestCase):
+    def setUp(self):
+        self.patcher = mock.patch(
+            "profiles_api.authentication.token_memo", VerifiedTokenMemo(2)
+        )
+        self.memo = self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+        self.auth = SimpleJWTAuthentication()
+
+    def token(self, user_id, expires_in=60):
+        payload = {"user_id": user_id, "exp": int(time.time()) + expires_in}
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+
+    def test_override_settings_reconfigures_the_module_memo(self):
+        self.patcher.stop()
+        self.addCleanup(self.patcher.start)
+        with override_settings(JWT_TOKEN_MEMO={"MAX_SIZE": 0, "POLICY": "fifo"}):
+            self.assertEqual((token_memo.max_size, token_memo.policy), (0, "fifo"))
+        self.assertEqual(token_memo.max_size, settings.JWT_TOKEN_MEMO["MAX_SIZE"])
+
+    def test_expired_entries_are_not_served(self):
+        token = self.token(1)
+        self.memo.put(token, {"user_id": 1, "exp": time.time() - 1})
+        self.assertIsNone(self.memo.get(token))
+        self.assertEqual(self.memo.stats()["size"], 0)
+
+        expired = self.token(2, expires_in=-10)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user_id(expired)
+        self.assertEqual(self.memo.stats()["size"], 0)
+
+    def test_failed_decodes_are_not_memoized(self):
+        forged = self.token(1)[:-2] + "xx"
+        for _ in range(2):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.get_user_id(forged)
+        stats = self.memo.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (0, 0, 2))
+
+    def test_lru_limit_evicts_the_least_recently_used(self):
+        first, second, third = (self.token(n) for n in (1, 2, 3))
+        self.auth.get_user_id(first)
+        self.auth.get_user_id(second)
+        self.auth.get_user_id(first)  # Now the most recently used.
+        self.auth.get_user_id(third)
+
+        self.assertEqual(self.memo.stats()["size"], 2)
+        self.assertIsNotNone(self.memo.get(first))
+        self.assertIsNone(self.memo.get(second))
+        self.assertIsNotNone(self.memo.get(third))
+
+
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        principal_cache.clear()
+        self.addCleanup(principal_cache.clear)
+        shared = mock.patch.object(principal_cache, "backend", "default")
+        shared.start()
+        self.addCleanup(shared.stop)
+        self.user = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+
+    def test_role_change_and_delete_reach_both_tiers(self):
+        key = principal_cache._key(self.user.pk)
+        cache.delete(key)  # The marker left by create_user has expired.
+        principal_cache.get_user(self.user.pk)
+        self.assertIsInstance(cache.get(key), User)
+        with self.assertNumQueries(0):
+            principal_cache.get_user(self.user.pk)
+
+        self.user.role = "teacher"
+        self.user.save()
+        self.assertEqual(principal_cache.stats()["size"], 0)
+        self.assertEqual(cache.get(key), INVALIDATED)
+        self.assertEqual(principal_cache.get_user(self.user.pk).role, "teacher")
+
+        self.user.delete()
+        with self.assertRaises(User.DoesNotExist):
+            principal_cache.get_user(self.user.pk)
+
+    def test_a_change_in_one_process_reaches_local_entries_in_another(self):
+        other = PrincipalCache(backend="default")  # another worker's cache
+        user_id = self.user.pk
+        cache.delete(principal_cache._key(user_id))
+        self.assertEqual(other.get_user(user_id).role, "student")
+        with self.assertNumQueries(0):
+            other.get_user(user_id)
+        self.assertEqual(other.stats()["local_hits"], 1)
+
+        # The signal invalidates this process's cache only.
+        User.objects.filter(pk=user_id).update(role="teacher")
+        principal_cache.invalidate(user_id)
+        self.assertEqual(other.get_user(user_id).role, "teacher")
+        self.assertEqual(async_to_sync(other.aget_user)(user_id).role, "teacher")
+
+    def test_local_tier_is_off_without_a_shared_tier(self):
+        local_only = PrincipalCache()
+        with self.assertNumQueries(2):
+            local_only.get_user(self.user.pk)
+            local_only.get_user(self.user.pk)
+        self.assertEqual(local_only.stats()["size"], 0)
+        single_process = PrincipalCache(local_ttl=60)
+        with self.assertNumQueries(1):
+            single_process.get_user(self.user.pk)
+            single_process.get_user(self.user.pk)
+
+    def test_default_settings_cache_locally_and_drop_changed_users(self):
+        default = PrincipalCache.from_settings()
+        with self.assertNumQueries(1):
+            default.get_user(self.user.pk)
+            default.get_user(self.user.pk)
+        default.invalidate(self.user.pk)
+        with self.assertNumQueries(1):
+            default.get_user(self.user.pk)
+
+    def test_override_settings_reconfigures_the_module_cache(self):
+        with override_settings(PRINCIPAL_CACHE={"LOCAL_TTL": 0}):
+            self.assertIsNone(principal_cache.backend)
+            with self.assertNumQueries(2):
+                principal_cache.get_user(self.user.pk)
+                principal_cache.get_user(self.user.pk)
+        self.assertEqual(
+            principal_cache.local_ttl, settings.PRINCIPAL_CACHE["LOCAL_TTL"]
+        )
+
+    def test_version_check_skips_the_shared_get_for_recent_checks(self):
+        checked = PrincipalCache(ttl=300, backend="default", version_check=60)
+        user_id = self.user.pk
+        cache.delete(checked._key(user_id))
+        checked.get_user(user_id)
+        with mock.patch.object(cache, "get", side_effect=AssertionError):
+            self.assertEqual(checked.get_user(user_id).role, "student")
+
+        # Once the check is due, a version moved by another worker applies.
+        with mock.patch("profiles_api.principals.time.monotonic",
+                        return_value=time.monotonic() + 61):
+            User.objects.filter(pk=user_id).update(role="teacher")
+            principal_cache.invalidate(user_id)
+            self.assertEqual(checked.get_user(user_id).role, "teacher")
+
+    def test_a_read_racing_an_invalidation_is_not_cached(self):
+        real_get = User.objects.get
+        user_id = self.user.pk
+        cache.delete(principal_cache._key(user_id))
+
+        def read_then_change(*args, **kwargs):
+            stale = real_get(*args, **kwargs)
+            User.objects.filter(pk=user_id).update(role="student")
+            principal_cache.invalidate(user_id)
+            return stale
+
+        for backend in ("default", None):
+            with self.subTest(backend=backend):
+                User.objects.filter(pk=user_id).update(role="teacher")
+                # Without a shared tier the local one is on only when asked for.
+                local_ttl = mock.patch.object(principal_cache, "_local_ttl", 60)
+                with mock.patch.object(principal_cache, "backend", backend), local_ttl:
+                    with mock.patch.object(
+                        User.objects, "get", side_effect=read_then_change
+                    ):
+                        principal_cache.get_user(user_id)
+                    self.assertEqual(principal_cache.stats()["size"], 0)
+                    self.assertEqual(principal_cache.get_user(user_id).role, "student")
+                principal_cache.clear()
+        self.assertEqual(cache.get(principal_cache._key(user_id)), INVALIDATED)
+
+
+class ToggleLikeTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.students = [
+            User.objects.create_user(
+                f"student{n}@example.com", f"Student {n}", "secret1", role="student"
+            )
+            for n in range(4)
+        ]
+        self.feed = Feed.objects.create(user=teacher, text="post")
+        self.feed.likes.add(*self.students[1:])
+        Feed.objects.filter(pk=self.feed.pk).update(likes_count=3)
+
+    def assertStatements(self, count, func, *args):
+        """Like assertNumQueries, leaving out the savepoints atomic() adds."""
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args)
+        statements = [
+            q["sql"] for q in queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))
+        ]
+        self.assertEqual(len(statements), count, statements)
+        return result
+
+    def test_like_and_unlike_take_three_queries_whatever_the_likers(self):
+        student = self.students[0]
+        self.assertEqual(
+            self.assertStatements(3, toggle_like, self.feed.pk, student.pk), (True, 4)
+        )
+        self.assertEqual(
+            self.assertStatements(3, toggle_like, self.feed.pk, student.pk), (False, 3)
+        )
+        self.assertEqual(Feed.objects.get(pk=self.feed.pk).likes_count, 3)
+
+    def test_losing_a_concurrent_like_leaves_the_counter_alone(self):
+        student = self.students[1]
+        # The other request already inserted the like and bumped the counter
+        # after this one read "not liked, 2 likes".
+        with mock.patch("profiles_api.likes.read_like", return_value=(2, False)):
+            self.assertEqual(toggle_like(self.feed.pk, student.pk), (True, 3))
+        self.assertEqual(Feed.objects.get(pk=self.feed.pk).likes_count, 3)
+        self.assertEqual(self.feed.likes.filter(pk=student.pk).count(), 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 search is SQLite-only")
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "asmith@example.com", "Anderson Smith", "secret1", role="student"
+        )
+        User.objects.create_user(
+            "other@example.com", "Maria Lopez", "secret1", role="student"
+        )
+
+    def found(self, query):
+        return [user.pk for user in search_users(query, 10)]
+
+    def test_terms_match_word_prefixes_only(self):
+        self.assertEqual(self.found("and"), [self.user.pk])
+        self.assertEqual(self.found("ande smi"), [self.user.pk])
+        self.assertEqual(self.found("asmith@"), [self.user.pk])
+        # Substrings inside a word are no longer matched (see README).
+        self.assertEqual(self.found("ers"), [])
+
+    def test_renames_and_deletes_reach_the_index(self):
+        self.user.name = "Beatrice Smith"
+        self.user.save()
+        self.assertEqual(self.found("anderson"), [])
+        self.assertEqual(self.found("beat"), [self.user.pk])
+        self.user.delete()
+        self.assertEqual(self.found("beat"), [])
+
+    def test_search_reads_from_the_routed_database(self):
+        with mock.patch(
+            "profiles_api.search.router.db_for_read", return_value="default"
+        ) as db_for_read:
+            self.assertEqual(self.found("and"), [self.user.pk])
+        db_for_read.assert_called_once_with(User)
+
+    def test_triggers_survive_later_user_table_rebuilds(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'user' ORDER BY name"
+            )
+            triggers = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(triggers, ["user_search_ad", "user_search_ai", "user_search_au"])
+
+
+class RepairLikeCountsTests(TestCase):
+    def test_drifted_counts_are_recounted_in_the_database(self):
+        teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        students = [
+            User.objects.create_user(
+                f"student{n}@example.com", f"Student {n}", "secret1", role="student"
+            )
+            for n in range(3)
+        ]
+        feeds = [Feed.objects.create(user=teacher, text=f"post {n}") for n in range(3)]
+        feeds[0].likes.add(*students)
+        feeds[1].likes.add(students[0])
+        Feed.objects.filter(pk=feeds[0].pk).update(likes_count=1)
+        Feed.objects.filter(pk=feeds[1].pk).update(likes_count=1)
+        Feed.objects.filter(pk=feeds[2].pk).update(likes_count=4)
+
+        out = StringIO()
+        call_command("repair_like_counts", "--dry-run", "--batch-size=2", stdout=out)
+        self.assertIn("Checked 3 feeds, would repair 2.", out.getvalue())
+        self.assertEqual(Feed.objects.get(pk=feeds[2].pk).likes_count, 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("repair_like_counts", "--batch-size=2", stdout=out)
+        self.assertIn("Checked 3 feeds, repaired 2.", out.getvalue())
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertTrue(updates)
+        self.assertTrue(all("COUNT(" in sql for sql in updates))
+        self.assertEqual(
+            list(Feed.objects.order_by("pk").values_list("likes_count", flat=True)),
+            [3, 1, 0],
+        )
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.student = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+        self.feed = Feed.objects.create(user=self.teacher, text="first post")
+        feed_page_cache.clear()
+        enabled = mock.patch.object(feed_page_cache, "enabled", True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def assertRevalidates(self, url, etag, expected_status):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def test_unchanged_cached_feed_list_is_304_after_one_like_status_query(self):
+        etag = self.client.get(reverse("feeds"))["ETag"]
+        with self.assertNumQueries(1):
+            response = self.assertRevalidates(reverse("feeds"), etag, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_uncached_feed_list_revalidates_without_a_table_aggregate(self):
+        etag = self.client.get(reverse("feeds"))["ETag"]
+        feed_page_cache.clear()
+        with mock.patch.object(feed_page_cache, "enabled", False):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertRevalidates(reverse("feeds"), etag, 304)
+        # The page query and the caller's likes on it; no COUNT(*) or MAX()
+        # over the whole table.
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(
+            any("COUNT(" in q["sql"] or "MAX(" in q["sql"] for q in queries)
+        )
+
+    def test_liked_by_me_is_per_user_on_a_shared_page(self):
+        first = self.client.get(reverse("feeds"))
+        self.assertFalse(first.data["results"][0]["liked_by_me"])
+        self.client.post(reverse("feed-like", args=[self.feed.pk]))
+
+        # The cached page still holds the old count (like lag), but the
+        # caller's own like shows at once and changes their ETag.
+        liked = self.assertRevalidates(reverse("feeds"), first["ETag"], 200)
+        self.assertTrue(liked.data["results"][0]["liked_by_me"])
+        other = APIClient()
+        other.force_authenticate(self.teacher)
+        response = other.get(reverse("feeds"))
+        self.assertFalse(response.data["results"][0]["liked_by_me"])
+
+    def test_profile_multi_get_is_one_query_in_request_order(self):
+        url = reverse("profile-method")
+        ids_url = f"{url}?ids={self.student.pk},999,{self.teacher.pk}"
+        with self.assertNumQueries(1):
+            response = self.client.get(ids_url)
+        self.assertEqual(
+            [user["id"] for user in response.data], [self.student.pk, self.teacher.pk]
+        )
+        self.assertRevalidates(ids_url, response["ETag"], 304)
+        self.assertEqual(self.client.get(url, {"ids": "1,x"}).status_code, 400)
+        response = self.client.get(url, {"ids": "1,\u00b2"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "Invalid id: '\u00b2'."})
+        with self.settings(PROFILE_MULTI_GET_MAX=2):
+            response = self.client.get(url, {"ids": "1,2,1,3"})
+        self.assertEqual(
+            response.data, {"error": "At most 2 ids can be requested at once."}
+        )
+
+    @mock.patch.object(feed_page_cache, "like_lag", 0)
+    def test_feed_list_etag_moves_on_every_kind_of_write(self):
+        url = reverse("feeds")
+
+        def rename_author():
+            author = User.objects.get(pk=self.teacher.pk)
+            author.name = "Teacher Renamed"
+            author.save()
+
+        writes = [
+            lambda: self.client.post(reverse("feed-like", args=[self.feed.pk])),
+            lambda: Feed.objects.create(user=self.teacher, text="second post"),
+            rename_author,
+            lambda: self.feed.delete(),
+        ]
+        for write in writes:
+            etag = self.client.get(url)["ETag"]
+            write()
+            self.assertRevalidates(url, etag, 200)
+
+    def test_author_saves_that_keep_name_and_email_leave_feeds_alone(self):
+        url = reverse("feeds")
+        etag = self.client.get(url)["ETag"]
+        teacher = APIClient()
+        teacher.force_authenticate(self.teacher)
+        with CaptureQueriesContext(connection) as queries:
+            response = teacher.patch(
+                reverse("profile-details", args=[self.teacher.pk]), {"role": "teacher"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('UPDATE "feed"' in q["sql"] for q in queries))
+        self.assertRevalidates(url, etag, 304)
+
+    def test_feed_list_ignores_if_modified_since(self):
+        url = reverse("feeds")
+        kept = Feed.objects.create(user=self.teacher, text="second post")
+        response = self.client.get(url)
+        self.assertNotIn("Last-Modified", response)
+        since = http_date(time.time() + 60)
+        self.feed.delete()
+        # A delete moves no timestamp; only the ETag notices it.
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.data["results"]], [kept.pk])
+
+    def test_profile_detail_revalidates(self):
+        url = reverse("profile-details", args=[self.teacher.pk])
+        etag = self.client.get(url)["ETag"]
+        self.assertRevalidates(url, etag, 304)
+        self.teacher.name = "Teacher Renamed"
+        self.teacher.save()
+        self.assertRevalidates(url, etag, 200)
+
+
+class FeedPageCacheTests(TestCase):
+    def setUp(self):
+        self.cache = FeedPageCache(LocalStore(), like_lag=60)
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_generation_bump_rebuilds_but_likes_lag(self):
+        self.assertEqual(self.cache.fetch("20:", self.build), 1)
+        self.assertEqual(self.cache.fetch("20:", self.build), 1)
+
+        self.cache.bump_likes()
+        self.assertEqual(self.cache.fetch("20:", self.build), 1)
+        with mock.patch.object(self.cache, "like_lag", 0):
+            self.assertEqual(self.cache.fetch("20:", self.build), 2)
+
+        self.cache.bump()
+        self.assertEqual(self.cache.fetch("20:", self.build), 3)
+        self.assertEqual(self.cache.fetch("50:", self.build), 4)
+
+    def test_per_process_store_is_off_unless_enabled_explicitly(self):
+        self.assertFalse(FeedPageCache.from_settings().enabled)
+        with self.settings(FEED_CACHE={"BACKEND": "default"}):
+            self.assertTrue(FeedPageCache.from_settings().enabled)
+        with self.settings(FEED_CACHE={"ENABLED": True}):
+            self.assertTrue(FeedPageCache.from_settings().enabled)
+
+    def test_override_settings_reconfigures_the_module_cache(self):
+        self.assertFalse(feed_page_cache.enabled)
+        with self.settings(FEED_CACHE={"ENABLED": True, "LIKE_LAG": 0}):
+            self.assertTrue(feed_page_cache.enabled)
+            self.assertEqual(feed_page_cache.like_lag, 0)
+        self.assertFalse(feed_page_cache.enabled)
+        self.assertEqual(feed_page_cache.like_lag, 5)
+
+    def test_lookup_only_returns_fresh_pages(self):
+        self.assertIsNone(self.cache.lookup("20:"))
+        self.cache.fetch("20:", self.build)
+        self.assertEqual(self.cache.lookup("20:"), 1)
+        self.assertEqual(async_to_sync(self.cache.alookup)("20:"), 1)
+        self.cache.bump()
+        self.assertIsNone(async_to_sync(self.cache.alookup)("20:"))
+
+    def test_stale_page_is_served_while_another_request_rebuilds(self):
+        self.cache.fetch("20:", self.build)
+        self.cache.bump()
+        self.cache.store.add("feedpage:page:20::lock", 1)
+
+        self.assertEqual(self.cache.fetch("20:", self.build), 1)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.cache.stats()["stale_hits"], 1)
+
+
+@override_settings(LIKE_BUFFER={"ENABLED": True, "FLUSH_INTERVAL": 0})
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.feed = Feed.objects.create(user=self.teacher, text="viral post")
+        self.students = [
+            User.objects.create_user(
+                f"student{i}@example.com", f"Student {i}", "secret1", role="student"
+            )
+            for i in range(3)
+        ]
+        like_buffer.clear()
+        self.addCleanup(like_buffer.clear)
+        feed_page_cache.clear()
+
+    def like(self, student):
+        client = APIClient()
+        client.force_authenticate(student)
+        return client.post(reverse("feed-like", args=[self.feed.pk]))
+
+    def test_likes_are_buffered_coalesced_and_flushed(self):
+        with self.assertNumQueries(1):
+            response = self.like(self.students[0])
+        self.assertEqual(response.data["likes_count"], 1)
+        self.like(self.students[1])
+        self.like(self.students[2])
+        self.like(self.students[2])  # unliked again before the flush
+
+        self.assertFalse(self.feed.likes.exists())
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        listed = client.get(reverse("feeds")).data["results"][0]
+        self.assertEqual(listed["likes_count"], 2)
+
+        self.assertEqual(like_buffer.flush(), 3)
+        self.feed.refresh_from_db()
+        self.assertEqual(self.feed.likes_count, 2)
+        self.assertEqual(
+            set(self.feed.likes.values_list("pk", flat=True)),
+            {self.students[0].pk, self.students[1].pk},
+        )
+        listed = client.get(reverse("feeds")).data["results"][0]
+        self.assertEqual(listed["likes_count"], 2)
+
+    def test_unlike_after_flush_is_applied_on_the_next_flush(self):
+        self.like(self.students[0])
+        like_buffer.flush()
+        response = self.like(self.students[0])
+        self.assertEqual(response.data, {"message": "Feed unliked", "likes_count": 0})
+        like_buffer.flush()
+        self.feed.refresh_from_db()
+        self.assertEqual(self.feed.likes_count, 0)
+        self.assertFalse(self.feed.likes.exists())
+
+    def flush_after_concurrent_like(self):
+        # Another writer likes the post between the flush's read and its INSERT.
+        def racing_insert(pairs):
+            self.feed.likes.add(self.students[0])
+            return _insert_likes(pairs)
+
+        self.like(self.students[0])
+        self.like(self.students[1])
+        with mock.patch("profiles_api.like_buffer._insert_likes", racing_insert):
+            like_buffer.flush()
+        self.feed.refresh_from_db()
+        self.assertEqual(self.feed.likes.count(), 2)
+        # The racing writer bumps its own count; the flush adds only its row.
+        self.assertEqual(self.feed.likes_count, 1)
+
+    def test_flush_counts_only_rows_it_inserted(self):
+        self.flush_after_concurrent_like()
+
+    def test_flush_counts_inserted_rows_on_other_backends(self):
+        with mock.patch.object(connection, "vendor", "mysql"):
+            self.flush_after_concurrent_like()
+
+
+class SqliteTuningTests(TestCase):
+    def test_profile_is_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+        self.assertEqual(busy_timeout, 5000)
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+    def test_journal_mode_is_only_set_when_serving(self):
+        fake = mock.MagicMock(vendor="sqlite")
+        executed = fake.cursor.return_value.__enter__.return_value.execute
+        sqlite_tuning.apply(fake)
+        self.assertNotIn(mock.call("PRAGMA journal_mode = WAL"), executed.call_args_list)
+        sqlite_tuning.apply(fake, persistent=True)
+        executed.assert_any_call("PRAGMA journal_mode = WAL")
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_seeded_scenarios_succeed_and_regressions_are_flagged(self):
+        created = benchmarking.seed(students=20, teachers=3, feeds=30, likes=200)
+        self.assertEqual(created["feeds"], 30)
+        self.assertEqual(
+            Feed.likes.through.objects.count(),
+            sum(Feed.objects.values_list("likes_count", flat=True)),
+        )
+
+        data = benchmarking.Dataset(random.Random(0))
+        client = APIClient()
+        for name in ("feeds", "like", "profile"):
+            method, path, body, token = benchmarking.SCENARIOS[name](data)
+            response = client.generic(
+                method, path, HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+            self.assertLess(response.status_code, 400, name)
+
+        fast = benchmarking.summarize([(0.010, True, 2)] * 3000, 1.0)
+        slow = benchmarking.summarize([(0.020, True, 3)] * 3000, 2.0)
+        baseline, current = {"scenarios": {"feeds": fast}}, {"scenarios": {"feeds": slow}}
+        regressions = {
+            metric for _, metric, _, _ in benchmarking.compare(baseline, current)
+        }
+        self.assertEqual(
+            regressions, {"p50_ms", "p95_ms", "p99_ms", "rps", "queries_per_request"}
+        )
+        self.assertEqual(benchmarking.compare(baseline, baseline), [])
+
+    def test_noise_between_runs_of_the_same_code_is_not_a_regression(self):
+        def run(p95_ms, p99_ms):
+            samples = (
+                [(0.004, True, 2)] * 280
+                + [(p95_ms / 1000, True, 2)] * 16
+                + [(p99_ms / 1000, True, 2)] * 4
+            )
+            return benchmarking.summarize(samples, 1.0)
+
+        # Under 2 ms slower at p95, and p99 rests on 3 samples out of 300.
+        baseline = {"scenarios": {"like": run(4.7, 5.4)}}
+        current = {"scenarios": {"like": run(5.7, 30.0)}}
+        self.assertEqual(current["scenarios"]["like"]["p95_ms"], 5.7)
+        self.assertEqual(benchmarking.compare(baseline, current), [])
+        strict = benchmarking.compare(
+            baseline, current, min_delta_ms=0.5, min_tail_samples=3
+        )
+        self.assertEqual({metric for _, metric, _, _ in strict}, {"p95_ms", "p99_ms"})
+
+        # One outlier run out of three does not move the median.
+        combined = benchmarking.combine([run(4.7, 5.4), run(4.7, 90.0), run(4.8, 5.5)])
+        self.assertEqual((combined["runs"], combined["requests"]), (3, 300))
+        self.assertEqual(combined["p99_ms"], 5.5)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.students = [
+            User.objects.create_user(
+                f"student{n}@example.com", f"Student {n}", "secret1", role="student"
+            )
+            for n in range(2)
+        ]
+
+    def follow_and_post(self, text):
+        for student in self.students:
+            timeline.follow(student, self.teacher)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(reverse("feeds"), {"text": text}).data["id"]
+
+    def timeline_ids(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return [row["id"] for row in client.get(reverse("timeline")).data["results"]]
+
+    def test_posts_fan_out_and_unfollow_removes_them(self):
+        student = self.students[0]
+        self.assertEqual(self.timeline_ids(student), [])
+        feed_id = self.follow_and_post("hello followers")
+        self.assertEqual(TimelineEntry.objects.filter(feed_id=feed_id).count(), 2)
+        self.assertEqual(self.timeline_ids(student), [feed_id])
+
+        timeline.unfollow(student, self.teacher)
+        self.assertEqual(self.timeline_ids(student), [])
+        self.assertEqual(self.timeline_ids(self.students[1]), [feed_id])
+
+    @override_settings(TIMELINE={"FANOUT_LIMIT": 1})
+    def test_authors_with_many_followers_are_pulled_at_read_time(self):
+        feed_id = self.follow_and_post("too many followers to fan out")
+        self.assertFalse(TimelineEntry.objects.exists())
+        for student in self.students:
+            self.assertEqual(self.timeline_ids(student), [feed_id])
+
+        # Back under the limit, the post is still pulled rather than lost.
+        timeline.unfollow(self.students[0], self.teacher)
+        self.assertTrue(Feed.objects.get(pk=feed_id).pulled)
+        self.assertEqual(self.timeline_ids(self.students[1]), [feed_id])
+
+    def test_fan_out_counts_the_rows_it_writes(self):
+        feed_id = self.follow_and_post("once")
+        self.assertEqual(timeline.fan_out(Feed.objects.get(pk=feed_id)), 0)
+        self.assertEqual(TimelineEntry.objects.filter(feed_id=feed_id).count(), 2)
+
+    @override_settings(TIMELINE={"MAX_LENGTH": 2, "TRIM_SLACK": 1})
+    def test_writers_cap_timelines_without_the_trim_command(self):
+        ids = [self.follow_and_post(f"post {n}") for n in range(4)]
+        for student in self.students:
+            self.assertEqual(
+                TimelineEntry.objects.filter(owner=student).count(), 2
+            )
+            self.assertEqual(self.timeline_ids(student), ids[:1:-1])
+
+    def use_shared_cache(self):
+        """Point the timeline cache tier at a cache every process can see."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "shared": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                },
+            },
+            TIMELINE={"CACHE_ALIAS": "shared"},
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        return caches["shared"]
+
+    def test_cache_tier_is_off_without_an_alias(self):
+        feed_id = self.follow_and_post("uncached")
+        with mock.patch.object(timeline, "caches") as caches_used:
+            self.assertEqual(timeline.timeline_ids(self.students[0].pk), [feed_id])
+            timeline.invalidate([self.students[0].pk])
+        caches_used.__getitem__.assert_not_called()
+
+    def test_invalidations_are_seen_by_other_cache_instances(self):
+        self.use_shared_cache()
+        student = self.students[0]
+        feed_id = self.follow_and_post("first")
+        key = timeline._cache_key(student.pk)
+        # Another worker's connection to the same cache.
+        other = caches.create_connection("shared")
+        other.delete(key)
+        self.assertEqual(timeline.timeline_ids(student.pk), [feed_id])
+        self.assertEqual(other.get(key), [feed_id])
+
+        timeline.invalidate([student.pk])
+        self.assertEqual(other.get(key), timeline.INVALIDATED)
+
+    def test_rows_read_before_an_invalidation_are_not_cached(self):
+        store = self.use_shared_cache()
+        student = self.students[0]
+        self.follow_and_post("first")
+        add = store.add
+
+        def invalidated_meanwhile(*args, **kwargs):
+            timeline.invalidate([student.pk])
+            return add(*args, **kwargs)
+
+        with mock.patch.object(store, "add", invalidated_meanwhile):
+            timeline.timeline_ids(student.pk)
+        key = timeline._cache_key(student.pk)
+        self.assertEqual(store.get(key), timeline.INVALIDATED)
+
+    @override_settings(TIMELINE={"MAX_LENGTH": 2})
+    def test_trim_command_caps_each_timeline(self):
+        ids = [self.follow_and_post(f"post {n}") for n in range(3)]
+        self.assertEqual(self.timeline_ids(self.students[0]), ids[::-1])
+
+        call_command("trim_timelines", stdout=StringIO())
+        for student in self.students:
+            self.assertEqual(self.timeline_ids(student), ids[:0:-1])
+
+
+@override_settings(REQUEST_METRICS={"ENABLED": True, "HEADERS": True})
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+
+    def setUp(self):
+        principal_cache.clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.token = benchmarking.issue_token(self.user.id, self.user.email)
+
+    def test_queries_are_reported_per_request_and_endpoint(self):
+        client = APIClient()
+        url = reverse("profile-details", args=[self.user.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        query_count = len(queries)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-DB-Queries"], str(query_count))
+        self.assertIn("X-DB-Time-Ms", response)
+        self.assertIn("X-Request-Time-Ms", response)
+
+        endpoints = client.get(reverse("metrics")).data["endpoints"]
+        self.assertEqual(endpoints["profile-details"]["queries"]["count"], 1)
+        self.assertEqual(endpoints["profile-details"]["queries"]["sum"], query_count)
+
+        remote = client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(remote.status_code, 403)
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    async def test_async_requests_count_queries_run_in_worker_threads(self):
+        response = await AsyncClient().get(
+            reverse("profile-details", args=[self.user.id]),
+            headers={"authorization": f"Bearer {self.token}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response["X-DB-Queries"]), 0)
+        endpoints = registry.snapshot()
+        self.assertEqual(
+            endpoints["profile-details"]["queries"]["sum"],
+            int(response["X-DB-Queries"]),
+        )
+
+    def test_async_mode_follows_the_handler(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(RequestMetricsMiddleware(HttpResponse)))
+        with override_settings(REQUEST_METRICS={"ENABLED": False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestMetricsMiddleware(HttpResponse)
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        for number in range(3):
+            Feed.objects.create(user=cls.teacher, text=f"post {number}")
+
+    def setUp(self):
+        feed_page_cache.clear()
+        token = benchmarking.issue_token(self.teacher.id, self.teacher.email)
+        self.client = AsyncClient()
+        self.auth = {"authorization": f"Bearer {token}"}
+
+    def get(self, url, data=None, **headers):
+        return self.client.get(url, data, headers={**self.auth, **headers})
+
+    async def read(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_streamed_lists_match_the_paged_responses(self):
+        page = (await self.get(reverse("feeds"))).json()["results"]
+        response = await self.get(reverse("feeds"), {"stream": "1"})
+        self.assertEqual(response["Content-Type"], "application/json")
+        # Not revalidated: that would take a second pass over the table.
+        self.assertNotIn("ETag", response)
+        streamed = json.loads(await self.read(response))
+        for row in page:
+            del row["liked_by_me"]
+        self.assertEqual(streamed, page)
+
+        users = (await self.get(reverse("profile-method"))).json()
+        response = await self.get(
+            reverse("profile-method"), accept="application/x-ndjson"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = (await self.read(response)).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], users)
+
+    async def test_cached_feed_page_is_served_without_a_thread_hop(self):
+        with mock.patch.object(feed_page_cache, "enabled", True):
+            first = await self.get(reverse("feeds"))
+            with mock.patch(
+                "profiles_api.async_views.sync_to_async", side_effect=AssertionError
+            ):
+                second = await self.get(reverse("feeds"))
+        self.assertEqual(second.json(), first.json())
+
+    async def test_errors_match_drf(self):
+        response = await self.get(reverse("feeds"), {"fields": "id,nope"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": ["Unknown field(s): nope."]})
+
+        anonymous = await AsyncClient().get(reverse("feeds"))
+        self.assertEqual(anonymous.status_code, 403)
+        self.assertEqual(
+            anonymous.json(), {"detail": "Authentication credentials were not provided."}
+        )
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    # No database: TestCase's wrapping transaction would pin every read.
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "shared": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                },
+            },
+            READ_REPLICAS={
+                "ALIASES": ["replica"], "PIN_SECONDS": 5, "CACHE_ALIAS": "shared"
+            },
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.pins = caches["shared"]
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, method="get", user_id=None, status_code=200):
+        """Run a request through the middleware; return where a read went."""
+        seen = {}
+
+        def view(request):
+            if user_id is not None:
+                routing.identify(user_id)
+            seen["alias"] = self.router.db_for_read(Feed)
+            return HttpResponse(status=status_code)
+
+        request = getattr(self.factory, method)("/api/feeds/", REMOTE_ADDR="10.0.0.1")
+        ReplicaPinningMiddleware(view)(request)
+        return seen["alias"]
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.read_alias(user_id=1), "replica")
+        self.assertEqual(self.read_alias("post", user_id=1), "default")
+        self.assertEqual(self.router.db_for_write(Feed), "default")
+
+    def test_writer_is_pinned_to_primary_for_a_while(self):
+        self.read_alias("post", user_id=1)
+        self.assertEqual(self.read_alias(user_id=1), "default")
+        self.assertEqual(
+            self.read_alias(user_id=2), "replica", "other users are not pinned"
+        )
+        self.pins.clear()
+        self.assertEqual(self.read_alias(user_id=1), "replica")
+
+    def test_failed_writes_do_not_pin(self):
+        self.read_alias("post", user_id=1, status_code=400)
+        self.assertEqual(self.read_alias(user_id=1), "replica")
+
+    def test_async_requests_stay_async_and_pin_writers(self):
+        async def view(request):
+            await routing.aidentify(1)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(self.factory.post("/api/feeds/"))
+        self.assertEqual(self.read_alias(user_id=1), "default")
+
+    def test_pins_are_seen_by_other_cache_instances(self):
+        self.read_alias("post", user_id=1)
+        # Another worker's connection to the same cache.
+        other = {"shared": caches.create_connection("shared")}
+        with mock.patch.object(routing, "caches", other):
+            self.assertEqual(self.read_alias(user_id=1), "default")
+
+    def test_not_installed_without_replicas(self):
+        with self.settings(READ_REPLICAS={"ALIASES": []}):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaPinningMiddleware(HttpResponse)
+
+    def test_per_process_pin_cache_is_refused(self):
+        with self.settings(READ_REPLICAS={"ALIASES": ["replica"]}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'default'"):
+                ReplicaPinningMiddleware(HttpResponse)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            "teacher@example.com", "Teacher One", "secret1", role="teacher"
+        )
+        self.student = User.objects.create_user(
+            "student@example.com", "Student One", "secret1", role="student"
+        )
+        self.broadcaster = get_broadcaster()
+        backend = mock.patch.object(self.broadcaster, "backend", LocalBackend(history=3))
+        backend.start()
+        self.addCleanup(backend.stop)
+
+    def test_posts_and_batched_like_counts_are_published(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            feed_id = client.post(reverse("feeds"), {"text": "hello"}).data["id"]
+        client.force_authenticate(self.student)
+        with mock.patch.object(self.broadcaster, "_ensure_flusher"):
+            client.post(reverse("feed-like", args=[feed_id]))
+            client.post(reverse("feed-like", args=[feed_id]))
+            client.post(reverse("feed-like", args=[feed_id]))
+        self.broadcaster.flush_likes()
+
+        created, likes = self.broadcaster.backend.since(0)
+        self.assertEqual(created["event"], "feed.created")
+        self.assertEqual(created["data"]["id"], feed_id)
+        self.assertEqual(likes["event"], "feed.likes_changed")
+        self.assertEqual(likes["data"], {"feeds": [{"id": feed_id, "likes_count": 1}]})
+
+    async def test_stream_resumes_from_last_event_id(self):
+        for number in range(5):
+            self.broadcaster.publish("feed.created", {"id": number})
+
+        async def first_chunks(last_event_id, count):
+            stream = self.broadcaster.stream(last_event_id)
+            chunks = [await anext(stream) for _ in range(count)]
+            await stream.aclose()
+            return chunks
+
+        with mock.patch.object(self.broadcaster, "heartbeat", 0.01):
+            retry, missed, heartbeat = await first_chunks("4", 3)
+            _, reset = await first_chunks("1", 2)
+        self.assertEqual(retry, "retry: 3000\n\n")
+        self.assertEqual(missed, 'id: 5\nevent: feed.created\ndata: {"id":4}\n\n')
+        self.assertEqual(heartbeat, "id: 5\n: heartbeat\n\n")
+        # Events 2 and 3 have left the history: the client must refetch.
+        self.assertEqual(reset, "id: 5\nevent: stream.reset\ndata: {}\n\n")
+
+    def test_wsgi_polls_answer_at_once_and_accept_a_query_token(self):
+        token = benchmarking.issue_token(self.student.id, self.student.email)
+        url = f"{reverse('events')}?token={token}"
+        self.broadcaster.publish("feed.created", {"id": 1})
+        client = Client()
+
+        with mock.patch.object(self.broadcaster, "heartbeat", 60):
+            start = time.monotonic()
+            idle = client.get(url)
+            pending = client.get(url, HTTP_LAST_EVENT_ID="0")
+            self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(idle.status_code, 200)
+        self.assertEqual(idle.content, b"retry: 3000\n\nid: 1\n: heartbeat\n\n")
+        self.assertIn(b'id: 1\nevent: feed.created\ndata: {"id":1}', pending.content)
+        self.assertEqual(Client().get(reverse("events")).status_code, 403)
+
+    def test_override_settings_rebuilds_the_broadcaster(self):
+        with self.settings(EVENTS={"HEARTBEAT": 1}):
+            self.assertEqual(get_broadcaster().heartbeat, 1)
+        self.assertEqual(get_broadcaster().heartbeat, 15)
+        self.assertIs(get_broadcaster(), get_broadcaster())
@@ -0,0 +1,93 @@
+"""Token-bucket throttles for the login endpoint, stored in a shared cache."""
+
+import time
+
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .conf import app_settings
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "ip": {"RATE": "30/min", "BURST": 10},
+    "email": {"RATE": "10/min", "BURST": 5},
+}
+
+DURATIONS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600}
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> tokens per second."""
+    count, _, period = rate.partition("/")
+    return int(count) / DURATIONS[period]
+
+
+conf = app_settings("LOGIN_THROTTLE", DEFAULTS)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket keyed by ``get_ident_key``; the bucket state lives in the
+    ``LOGIN_THROTTLE["CACHE_ALIAS"]`` cache. Only a cache shared by all
+    workers enforces ``RATE`` overall; with a per-process cache (LocMem, the
+    default) each worker keeps its own buckets and the effective limit is
+    ``RATE`` times the number of workers. ``manage.py check --deploy`` warns
+    about that (see ``checks.py``).
+
+    Buckets refill at ``RATE`` and hold at most ``BURST`` tokens, so a client
+    can burst briefly but not sustain more than ``RATE``. The read-modify-write
+    is not atomic across workers; a few extra requests may slip through under
+    contention, which is acceptable for abuse control.
+    """
+
+    scope = None
+
+    def __init__(self):
+        scope_conf = conf(self.scope)
+        self.rate = parse_rate(scope_conf["RATE"])
+        self.burst = scope_conf["BURST"]
+        self.cache = caches[conf("CACHE_ALIAS")]
+        self.wait_seconds = None
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        key = f"throttle:{self.scope}:{ident}"
+        now = time.time()
+        tokens, stamp = self.cache.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        # Keep the entry until the bucket would be full again.
+        timeout = int((self.burst - tokens + 1) / self.rate) + 1
+
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / self.rate
+            self.cache.set(key, (tokens, now), timeout)
+            return False
+
+        self.cache.set(key, (tokens - 1, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = "ip"
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    scope = "email"
+
+    def get_ident_key(self, request):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email:
+            return None
+        return email.strip().lower()
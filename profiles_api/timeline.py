@@ -0,0 +1,261 @@
+"""
+Personalized timelines: fan-out on write with a fan-out-on-read fallback.
+
+When a teacher posts, the feed id is written into a ``TimelineEntry`` row for
+each follower, so reading a timeline is one indexed range fetch on
+``(owner, feed)``. A post whose author has more than ``FANOUT_LIMIT``
+followers is not fanned out but marked ``Feed.pulled``, and pulled posts of
+followed teachers are merged in at read time, whatever the author's follower
+count is by then. With ``CACHE_ALIAS`` set, the newest ``CACHE_LENGTH`` ids
+of each timeline are also kept in that Django cache alias. It must be shared
+by all workers (Redis, Memcached): invalidations are written there, and a
+per-process cache would let other workers serve stale timelines for
+``CACHE_TTL`` seconds. Without it (the default) timelines are read from the
+table on every request.
+
+Writers keep each timeline at ``MAX_LENGTH`` entries: one that grows past
+``MAX_LENGTH + TRIM_SLACK`` is cut back to ``MAX_LENGTH``, so the delete is
+paid once every ``TRIM_SLACK`` posts rather than on each one.
+``manage.py trim_timelines`` cuts every timeline back to exactly
+``MAX_LENGTH``, e.g. after lowering it.
+"""
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .conf import app_settings
+from .models import Feed, Follow, TimelineEntry, User
+
+DEFAULTS = {
+    "MAX_LENGTH": 800,
+    "TRIM_SLACK": 50,
+    "FANOUT_LIMIT": 5000,
+    "FANOUT_BATCH_SIZE": 1000,
+    "CACHE_ALIAS": None,
+    "CACHE_LENGTH": 200,
+    "CACHE_TTL": 300,
+    "INVALIDATE_GRACE": 10,
+}
+
+# Cached in place of a timeline that was just invalidated; see invalidate().
+INVALIDATED = "invalidated"
+
+
+conf = app_settings("TIMELINE", DEFAULTS)
+
+
+def _cache():
+    alias = conf("CACHE_ALIAS")
+    return caches[alias] if alias else None
+
+
+def _cache_key(user_id):
+    return f"timeline:{user_id}"
+
+
+def invalidate(user_ids):
+    """
+    Drop the cached timelines of ``user_ids``. A marker stays behind for
+    ``INVALIDATE_GRACE`` seconds: a reader that loaded the rows before this
+    call caches them with ``add``, which fails while the marker is there.
+    """
+    cache = _cache()
+    if cache is None:
+        return
+    cache.set_many(
+        {_cache_key(user_id): INVALIDATED for user_id in user_ids},
+        conf("INVALIDATE_GRACE"),
+    )
+
+
+def fan_out(feed):
+    """
+    Write ``feed`` into its followers' timelines, or mark it ``pulled`` if the
+    author is too big. Call it once the feed is committed
+    (``transaction.on_commit``), so readers that refill the cache afterwards
+    see the new entries. Returns the number of entries written.
+    """
+    # Read the counter fresh: request.user may come from the principal cache.
+    followers_count = User.objects.values_list("followers_count", flat=True).get(
+        pk=feed.user_id
+    )
+    if followers_count > conf("FANOUT_LIMIT"):
+        Feed.objects.filter(pk=feed.pk).update(pulled=True)
+        return 0
+
+    batch_size = conf("FANOUT_BATCH_SIZE")
+    follower_ids = (
+        Follow.objects.filter(followee_id=feed.user_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    written = 0
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+        if len(batch) >= batch_size:
+            written += _write_batch(feed.pk, batch)
+            batch = []
+    if batch:
+        written += _write_batch(feed.pk, batch)
+    return written
+
+
+def _write_batch(feed_id, owner_ids):
+    """Add ``feed_id`` to the owners' timelines; returns the rows inserted."""
+    entries = TimelineEntry.objects.filter(feed_id=feed_id, owner_id__in=owner_ids)
+    # Rows a concurrent follow() backfilled are skipped, not written again.
+    before = entries.count()
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, feed_id=feed_id) for owner_id in owner_ids],
+        ignore_conflicts=True,
+    )
+    written = entries.count() - before
+    _cap(owner_ids, conf("MAX_LENGTH"), conf("TRIM_SLACK"))
+    invalidate(owner_ids)
+    return written
+
+
+def _cap(owner_ids, max_length, slack=0):
+    """
+    Cut the timelines of ``owner_ids`` that hold more than ``max_length +
+    slack`` entries back to their newest ``max_length``; returns rows deleted.
+    """
+    newest = TimelineEntry.objects.filter(owner_id=OuterRef("pk")).order_by(
+        "-feed_id"
+    ).values("feed_id")
+    limit = max_length + slack
+    cutoffs = (
+        User.objects.filter(pk__in=owner_ids)
+        .annotate(
+            overflow=Subquery(newest[limit : limit + 1]),
+            cutoff=Subquery(newest[max_length : max_length + 1]),
+        )
+        .filter(overflow__isnull=False)
+        .values_list("pk", "cutoff")
+    )
+    deleted = 0
+    for owner_id, cutoff in cutoffs:
+        count, _ = TimelineEntry.objects.filter(
+            owner_id=owner_id, feed_id__lte=cutoff
+        ).delete()
+        deleted += count
+    return deleted
+
+
+def follow(follower, followee):
+    """
+    Make ``follower`` follow ``followee`` and backfill their recent posts.
+
+    Returns ``False`` if the follow already existed.
+    """
+    try:
+        with transaction.atomic():
+            Follow.objects.create(follower=follower, followee=followee)
+            User.objects.filter(pk=followee.pk).update(
+                followers_count=F("followers_count") + 1
+            )
+    except IntegrityError:
+        return False
+
+    # Pulled posts are merged in at read time already.
+    recent = Feed.objects.filter(user=followee, pulled=False).order_by(
+        "-id"
+    ).values_list("id", flat=True)[: conf("MAX_LENGTH")]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner=follower, feed_id=feed_id) for feed_id in recent],
+        ignore_conflicts=True,
+    )
+    _cap([follower.pk], conf("MAX_LENGTH"), conf("TRIM_SLACK"))
+    invalidate([follower.pk])
+    return True
+
+
+def unfollow(follower, followee):
+    """Remove the follow and the followee's posts from the follower's timeline."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            follower=follower, followee=followee
+        ).delete()
+        if not deleted:
+            return False
+        User.objects.filter(pk=followee.pk).update(
+            followers_count=F("followers_count") - 1
+        )
+        TimelineEntry.objects.filter(owner=follower, feed__user=followee).delete()
+    invalidate([follower.pk])
+    return True
+
+
+def _materialized_ids(user_id, before, limit):
+    """Newest-first feed ids from the cache tier, falling back to the table."""
+    cache = _cache()
+    if cache is None:
+        return _table_ids(user_id, before, limit)
+    key = _cache_key(user_id)
+    cache_length = conf("CACHE_LENGTH")
+
+    ids = cache.get(key)
+    if ids is None or ids == INVALIDATED:
+        ids = list(
+            TimelineEntry.objects.filter(owner_id=user_id)
+            .order_by("-feed_id")
+            .values_list("feed_id", flat=True)[:cache_length]
+        )
+        # Not set(): an invalidation since the read must win over these rows.
+        cache.add(key, ids, conf("CACHE_TTL"))
+
+    # A short cached list is the whole timeline; a full one is only its head.
+    complete = len(ids) < cache_length
+    if before is not None:
+        ids = [feed_id for feed_id in ids if feed_id < before]
+    if complete or len(ids) >= limit:
+        return ids[:limit]
+
+    # The request reaches past the cached window; read that slice directly.
+    return _table_ids(user_id, before, limit)
+
+
+def _table_ids(user_id, before, limit):
+    entries = TimelineEntry.objects.filter(owner_id=user_id)
+    if before is not None:
+        entries = entries.filter(feed_id__lt=before)
+    return list(
+        entries.order_by("-feed_id").values_list("feed_id", flat=True)[:limit]
+    )
+
+
+def _pulled_ids(user_id, before, limit):
+    """Recent posts by followed teachers that were not fanned out."""
+    followees = Follow.objects.filter(follower_id=user_id).values("followee_id")
+    feeds = Feed.objects.filter(pulled=True, user_id__in=followees)
+    if before is not None:
+        feeds = feeds.filter(id__lt=before)
+    return list(feeds.order_by("-id").values_list("id", flat=True)[:limit])
+
+
+def timeline_ids(user_id, before=None, limit=20):
+    """Return up to ``limit`` feed ids for ``user_id``, newest first."""
+    ids = set(_materialized_ids(user_id, before, limit))
+    ids.update(_pulled_ids(user_id, before, limit))
+    return sorted(ids, reverse=True)[:limit]
+
+
+def trim(max_length=None, batch_size=500):
+    """Cap every timeline at ``max_length`` entries; returns rows deleted."""
+    max_length = max_length or conf("MAX_LENGTH")
+    deleted = 0
+    last_owner = 0
+    while True:
+        owners = list(
+            TimelineEntry.objects.filter(owner_id__gt=last_owner)
+            .order_by("owner_id")
+            .values_list("owner_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not owners:
+            return deleted
+        deleted += _cap(owners, max_length)
+        invalidate(owners)
+        last_owner = owners[-1]
@@ -1,13 +1,20 @@
 from django.urls import path
-from .views import UserRegisterAPIView, UserLoginAPIView
-from .views import FeedAPIView, FeedLikeAPIView
+from .views import UserRegisterAPIView, UserLoginAPIView, UserImportAPIView
+from .views import FeedAPIView, FeedLikeAPIView, MetricsAPIView
+from .views import FollowAPIView, TimelineAPIView
+from .async_views import EventStreamView
 
 
 urlpatterns = [
     path("profile/", UserRegisterAPIView.as_view(), name="profile-method"),
+    path("profile/import/", UserImportAPIView.as_view(), name="profile-import"),
     path("profile/<int:pk>/", UserRegisterAPIView.as_view(), name="profile-details"),
+    path("profile/<int:pk>/follow/", FollowAPIView.as_view(), name="profile-follow"),
     path("login/", UserLoginAPIView.as_view(), name="user-login"),
     path("feeds/", FeedAPIView.as_view(), name="feeds"),
     path("feeds/<int:pk>/like/", FeedLikeAPIView.as_view(), name="feed-like"),
+    path("timeline/", TimelineAPIView.as_view(), name="timeline"),
+    path("metrics/", MetricsAPIView.as_view(), name="metrics"),
+    path("events/", EventStreamView.as_view(), name="events"),
     
 ]
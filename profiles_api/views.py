@@ -1,23 +1,46 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from django.conf import settings
-from django.db.models import Q
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from concurrent.futures import TimeoutError as FuturesTimeout
+import csv
+import itertools
 from datetime import datetime, timedelta
+from functools import partial
 import jwt
 
 from .serializers import UserSerializer
 from .models import User
 from .serializers import FeedSerializer
 from .models import Feed
-from django.db.models import Count
+from .pagination import FeedCursorPagination
+from .read_serializers import feed_reader, project, trim, user_reader
+from .search import search_users
+from .streaming import NDJSONRenderer, stream_queryset, wants_stream
+from .likes import liked_feed_ids, mark_liked_by_me, toggle_like
+from .like_buffer import like_buffer
+from . import bulk_import, conditional, images, multiget, timeline
+from .hashing import HashingPoolBusy, hashing_pool, needs_rehash
+from .metrics import registry
+from .permissions import IsLocalRequest
+from .principals import principal_cache
+from .events import get_broadcaster
+from .feed_cache import build_feed_page, feed_page_cache, page_variant
+from .throttling import LoginEmailThrottle, LoginIPThrottle
+from .authentication import token_memo
 
 
 class UserRegisterAPIView(APIView):
     """API for creating, reading, updating, and deleting user profiles"""
 
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -30,27 +53,55 @@ class UserRegisterAPIView(APIView):
 
     
         if pk:
-            try:
-                user = User.objects.get(pk=pk)
-                serializer = UserSerializer(user)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except User.DoesNotExist:
+            # The values row is the whole body, so it doubles as the validator.
+            row = user_reader.values(User.objects.filter(pk=pk)).first()
+            if row is None:
                 return Response(
                     {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
                 )
+            etag = conditional.row_etag(request, row)
+            cached = conditional.not_modified(request, etag)
+            if cached is not None:
+                return cached
+            response = Response(user_reader.to_representation(row), status=status.HTTP_200_OK)
+            return conditional.add_validators(response, etag)
+
+        elif "ids" in request.GET:
+            try:
+                ids = multiget.parse_ids(request.GET["ids"])
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            reader, _ = project(request, user_reader)
+            rows = multiget.in_request_order(multiget.users_by_ids(ids, reader), ids)
+            etag = conditional.rows_etag(request, rows)
+            cached = conditional.not_modified(request, etag)
+            if cached is not None:
+                return cached
+            response = Response(reader.many(rows), status=status.HTTP_200_OK)
+            return conditional.add_validators(response, etag)
 
         elif search_query:
-            users = User.objects.filter(
-                Q(name__icontains=search_query) | Q(email__icontains=search_query)
-            )
+            try:
+                limit = int(request.GET.get("limit", settings.USER_SEARCH_LIMIT))
+            except ValueError:
+                limit = settings.USER_SEARCH_LIMIT
+            limit = max(1, min(limit, settings.USER_SEARCH_MAX_LIMIT))
+            # Ranked search loads whole users; ?fields= only trims the output.
+            _, fields = project(request, user_reader)
+            users = search_users(search_query, limit)
             serializer = UserSerializer(users, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(trim(serializer.data, fields), status=status.HTTP_200_OK)
 
     
+        elif wants_stream(request):
+            reader, _ = project(request, user_reader)
+            users = reader.values(User.objects.order_by("pk"))
+            return stream_queryset(request, users, reader)
+
         else:
-            users = User.objects.all()
-            serializer = UserSerializer(users, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            reader, _ = project(request, user_reader)
+            users = reader.values(User.objects.all())
+            return Response(reader.many(users), status=status.HTTP_200_OK)
 
     def post(self, request):
         serializer = UserSerializer(data=request.data)
@@ -121,30 +172,86 @@ class UserRegisterAPIView(APIView):
             )
 
  
+class UserImportAPIView(APIView):
+    """Staff-only bulk creation of users from an uploaded CSV or NDJSON file."""
+
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Upload the users as a 'file' field."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fmt = request.data.get("format") or bulk_import.detect_format(
+            upload.name, upload.content_type
+        )
+        if fmt not in ("csv", "ndjson"):
+            return Response(
+                {"error": "Format must be csv or ndjson."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        max_rows = bulk_import.conf("API_MAX_ROWS")
+        rows = bulk_import.parse_rows(bulk_import.text_stream(upload), fmt)
+        try:
+            # One row past the cap is enough to refuse the upload.
+            rows = list(itertools.islice(rows, max_rows + 1))
+        except (UnicodeDecodeError, csv.Error):
+            return Response(
+                {"error": "Could not read the uploaded file."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > max_rows:
+            return Response(
+                {"error": f"At most {max_rows} rows per upload; use manage.py import_users."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        # Hash on a few threads, not a process per CPU forked from a web worker.
+        report = bulk_import.import_users(
+            rows, workers=bulk_import.conf("API_HASH_WORKERS"), threads=True
+        )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
 class UserLoginAPIView(APIView):
     """Manual login with JWT"""
 
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request):
         email = request.data.get("email")
         password = request.data.get("password")
 
-        if not email or not password:
+        # A JSON body can carry any type here; only non-empty strings count.
+        if not all(isinstance(value, str) and value for value in (email, password)):
             return Response(
                 {"error": "Email and password are required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        user = User.objects.with_email(email).first()
+
+        # Unknown emails still pay for a decoy hash so timing stays the same.
         try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response(
-                {"error": "Invalid email or password."},
-                status=status.HTTP_401_UNAUTHORIZED,
+            valid = hashing_pool.verify(password, user.password if user else None)
+            if valid and needs_rehash(user.password):
+                user.password = hashing_pool.run(make_password, password)
+                user.save(update_fields=["password"])
+        except (HashingPoolBusy, FuturesTimeout):
+            response = Response(
+                {"error": "Too many login attempts in progress, please retry."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
+            response["Retry-After"] = "1"
+            return response
 
-        if not user.check_password(password):
+        if not valid:
             return Response(
                 {"error": "Invalid email or password."},
                 status=status.HTTP_401_UNAUTHORIZED,
@@ -172,12 +279,51 @@ class UserLoginAPIView(APIView):
 
 class FeedAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = FeedCursorPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get(self, request):
-        # Fast query — har feed ke sath likes_count ek hi query me
-        feeds = Feed.objects.all().annotate(likes_count=Count("likes")).order_by("-created_at")
-        serializer = FeedSerializer(feeds, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Reads go through the compiled fast path: plain .values() rows, no
+        # per-field serializer machinery. Output matches FeedSerializer, or
+        # the ?fields= subset of it, selecting only the columns those need.
+        if wants_stream(request):
+            reader, _ = project(request, feed_reader)
+            feeds = reader.values(Feed.objects.all())
+            # No ETag: a validator for the whole table would cost another pass
+            # over it on every request.
+            return stream_queryset(request, feeds, reader)
+
+        # The overlays below key on id; the cursor needs created_at.
+        reader, fields = project(
+            request, feed_reader, extra=["liked_by_me"], required=["id"]
+        )
+        feeds = reader.values(Feed.objects.all(), "created_at")
+
+        # Pages are the same for every student: build each one once per feed
+        # generation.
+        paginator = self.pagination_class()
+        page = feed_page_cache.fetch(
+            page_variant(paginator, request, reader),
+            lambda: build_feed_page(paginator, feeds, request, self, reader),
+        )
+
+        # Likes still waiting in the write-behind buffer are added on top, then
+        # the caller's own likes for the page in one IN query.
+        results = like_buffer.overlay(page["results"])
+        if fields is None or "liked_by_me" in fields:
+            results = mark_liked_by_me(
+                results, liked_feed_ids(request.user, [row["id"] for row in results])
+            )
+        results = trim(results, fields)
+
+        # The page is revalidated against what this caller would be sent.
+        etag = conditional.feed_page_etag(request, results, page["next_cursor"])
+        cached = conditional.not_modified(request, etag)
+        if cached is not None:
+            return cached
+        paginator.restore(request, page["next_cursor"])
+        response = paginator.get_paginated_response(results)
+        return conditional.add_validators(response, etag)
 
     def post(self, request):
         if request.user.role != "teacher":
@@ -188,7 +334,11 @@ class FeedAPIView(APIView):
 
         serializer = FeedSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            feed = serializer.save(user=request.user)
+            if feed.image:
+                images.enqueue(feed)
+            transaction.on_commit(partial(timeline.fan_out, feed))
+            get_broadcaster().feed_created(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -199,11 +349,6 @@ class FeedLikeAPIView(APIView):
 
     def post(self, request, pk):
         """Like or unlike feed"""
-        try:
-            feed = Feed.objects.get(pk=pk)
-        except Feed.DoesNotExist:
-            return Response({"error": "Feed not found"}, status=status.HTTP_404_NOT_FOUND)
-
         user = request.user
 
   
@@ -211,11 +356,90 @@ class FeedLikeAPIView(APIView):
             return Response({"error": "Only students can like feeds."}, status=status.HTTP_403_FORBIDDEN)
 
      
-        if user in feed.likes.all():
-            feed.likes.remove(user)
-            message = "Feed unliked"
-        else:
-            feed.likes.add(user)
-            message = "Feed liked"
+        try:
+            liked, likes_count = toggle_like(pk, user.id)
+        except Feed.DoesNotExist:
+            return Response({"error": "Feed not found"}, status=status.HTTP_404_NOT_FOUND)
+        get_broadcaster().likes_changed(pk, likes_count)
+
+        message = "Feed liked" if liked else "Feed unliked"
+        return Response({"message": message, "likes_count": likes_count}, status=status.HTTP_200_OK)
+
+
+class FollowAPIView(APIView):
+    """Follow or unfollow a teacher."""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        """Toggle following the teacher with id ``pk``."""
+        try:
+            followee = User.objects.get(pk=pk)
+        except User.DoesNotExist:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if followee.role != "teacher":
+            return Response(
+                {"error": "Only teachers can be followed."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if followee.pk == request.user.pk:
+            return Response(
+                {"error": "You cannot follow yourself."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if timeline.unfollow(request.user, followee):
+            return Response({"message": "Unfollowed", "following": False}, status=status.HTTP_200_OK)
+        timeline.follow(request.user, followee)
+        return Response({"message": "Followed", "following": True}, status=status.HTTP_200_OK)
 
-        return Response({"message": message, "likes_count": feed.likes.count()}, status=status.HTTP_200_OK)
+
+class TimelineAPIView(APIView):
+    """Posts from the teachers the current user follows, newest first."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            before = int(request.GET["before"])
+        except (KeyError, ValueError):
+            before = None
+        limit = FeedCursorPagination().get_page_size(request)
+
+        ids = timeline.timeline_ids(request.user.id, before=before, limit=limit + 1)
+        has_next = len(ids) > limit
+        ids = ids[:limit]
+
+        reader, fields = project(
+            request, feed_reader, extra=["liked_by_me"], required=["id"]
+        )
+        rows = {row["id"]: row for row in reader.values(Feed.objects.filter(id__in=ids))}
+        results = [reader.to_representation(rows[pk]) for pk in ids if pk in rows]
+        results = like_buffer.overlay(results)
+        if fields is None or "liked_by_me" in fields:
+            results = mark_liked_by_me(results, liked_feed_ids(request.user, ids))
+        results = trim(results, fields)
+
+        next_url = None
+        if has_next and ids:
+            next_url = replace_query_param(request.build_absolute_uri(), "before", ids[-1])
+        return Response({"next": next_url, "results": results}, status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """Per-endpoint request histograms and cache counters, local requests only."""
+
+    authentication_classes = []
+    permission_classes = [IsLocalRequest]
+
+    def get(self, request):
+        return Response(
+            {
+                "endpoints": registry.snapshot(),
+                "principal_cache": principal_cache.stats(),
+                "token_memo": token_memo.stats(),
+                "feed_page_cache": feed_page_cache.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "profiles_api.metrics.RequestMetricsMiddleware",
+    "profiles_api.routing.ReplicaPinningMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,9 +83,57 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests (health-checked on reuse)
+        # so the SQLITE_TUNING pragmas are not re-run per request.
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Reads go to the READ_REPLICAS aliases, writes to "default"; a client that
+# wrote in the last PIN_SECONDS reads from "default" too (profiles_api/routing.py).
+# Pins live in CACHE_ALIAS, which must be shared by all workers once ALIASES is
+# set: a per-process cache (LocMem, like the implicit "default") raises
+# ImproperlyConfigured at startup. PROFILES_REPLICA_DB=<path> adds a second
+# SQLite file as a local stand-in replica, e.g. a copy of db.sqlite3, with the
+# pins in a file cache that every worker on the machine sees.
+DATABASE_ROUTERS = ["profiles_api.routing.PrimaryReplicaRouter"]
+READ_REPLICAS = {
+    "ALIASES": [],
+    "PIN_SECONDS": 5,
+    "CACHE_ALIAS": "default",
+}
+if os.environ.get("PROFILES_REPLICA_DB"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["PROFILES_REPLICA_DB"],
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "TEST": {"MIRROR": "default"},
+    }
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "replica-pins": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": BASE_DIR / ".cache" / "replica-pins",
+        },
+    }
+    READ_REPLICAS["ALIASES"] = ["replica"]
+    READ_REPLICAS["CACHE_ALIAS"] = "replica-pins"
+
+# Pragmas applied to every SQLite connection (see profiles_api/sqlite_tuning.py).
+# BUSY_TIMEOUT is in milliseconds; a negative CACHE_SIZE is in KiB.
+SQLITE_TUNING = {
+    "ENABLED": True,
+    "JOURNAL_MODE": "WAL",
+    "SYNCHRONOUS": "NORMAL",
+    "BUSY_TIMEOUT": 5000,
+    "CACHE_SIZE": -20000,
+    "MMAP_SIZE": 134217728,
+    "TEMP_STORE": "MEMORY",
+    "TRANSACTION_MODE": "IMMEDIATE",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -130,6 +181,141 @@ REST_FRAMEWORK = {
     )
 }
 
+# Serve the feed and profile endpoints with the ASGI-native views in
+# profiles_api/async_views.py (run under uvicorn / profiles_project.asgi).
+ASYNC_API = os.environ.get("PROFILES_ASYNC_API") == "1"
+
+# Keyset pagination for GET /api/feeds/ (?page_size= is clamped to the max)
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# Per-endpoint latency / query histograms, served at /api/metrics/ to
+# loopback and INTERNAL_IPS clients. HEADERS adds X-Request-Time-Ms etc.
+REQUEST_METRICS = {
+    "ENABLED": DEBUG,
+    "HEADERS": DEBUG,
+}
+INTERNAL_IPS = []
+
+# Rows fetched per round trip when streaming ?stream=1 / NDJSON list responses
+STREAM_CHUNK_SIZE = 500
+
+# Ranked user search for GET /api/profile/?search= (?limit= is clamped to the max)
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 100
+
+# Most profiles GET /api/profile/?ids= returns in one request
+PROFILE_MULTI_GET_MAX = 100
+
+# Per-user timelines (profiles_api/timeline.py). Posts by teachers with more
+# than FANOUT_LIMIT followers are merged in at read time instead of fanned out.
+# Writers cut a timeline back to MAX_LENGTH entries once it is TRIM_SLACK past
+# it. Set CACHE_ALIAS to a CACHES alias shared by all workers to cache the
+# newest ids of each timeline; invalidated timelines are then not re-cached
+# for INVALIDATE_GRACE seconds. None reads timelines from the table.
+TIMELINE = {
+    "MAX_LENGTH": 800,
+    "TRIM_SLACK": 50,
+    "FANOUT_LIMIT": 5000,
+    "FANOUT_BATCH_SIZE": 1000,
+    "CACHE_ALIAS": None,
+    "CACHE_LENGTH": 200,
+    "CACHE_TTL": 300,
+    "INVALIDATE_GRACE": 10,
+}
+
+# Background resizing of Feed.image uploads into WebP variants. Set
+# IN_PROCESS_WORKERS to 0 and run `manage.py process_images` to do the work
+# in a separate process instead.
+IMAGE_PIPELINE = {
+    "VARIANTS": {"thumb": 320, "medium": 1080},
+    "QUALITY": 80,
+    "IN_PROCESS_WORKERS": 1,
+    "MAX_ATTEMPTS": 3,
+    "STALE_AFTER": 600,
+}
+
+# Password checks on POST /api/login/ run on a capped pool; past MAX_PENDING
+# queued checks the endpoint answers 503 instead of tying up request workers.
+LOGIN_HASHING = {
+    "MAX_WORKERS": 2,
+    "MAX_PENDING": 16,
+    "TIMEOUT": 10,
+}
+
+# Bulk user import (POST /api/profile/import/ and `manage.py import_users`).
+# HASH_WORKERS=None uses one hashing process per CPU; 0 or 1 hashes inline.
+# Uploads through the API are capped at API_MAX_ROWS; use the command for more.
+# The API hashes on API_HASH_WORKERS threads inside the web worker.
+BULK_IMPORT = {
+    "BATCH_SIZE": 1000,
+    "HASH_WORKERS": None,
+    "API_MAX_ROWS": 10000,
+    "API_HASH_WORKERS": 2,
+}
+
+# Shared cache of GET /api/feeds/ pages (see profiles_api/feed_cache.py). Set
+# BACKEND to a CACHES alias to share pages between worker processes; like
+# counts in cached pages may lag by up to LIKE_LAG seconds. ENABLED = None
+# caches only when BACKEND is set; True also caches per process (one worker).
+FEED_CACHE = {
+    "ENABLED": None,
+    "BACKEND": None,
+    "TTL": 300,
+    "LIKE_LAG": 5,
+    "LOCK_TIMEOUT": 10,
+    "LOCK_WAIT": 2,
+}
+
+# Write-behind like toggles (see profiles_api/like_buffer.py): when ENABLED,
+# likes are coalesced in memory and written every FLUSH_INTERVAL seconds.
+LIKE_BUFFER = {
+    "ENABLED": False,
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING": 5000,
+}
+
+# Server-sent events at GET /api/events/ (see profiles_api/events.py). Set
+# BACKEND to a CACHES alias with atomic incr to fan events out across workers.
+EVENTS = {
+    "BACKEND": None,
+    "HISTORY": 1000,
+    "HEARTBEAT": 15,
+    "LIKES_INTERVAL": 1.0,
+}
+
+# Token buckets for POST /api/login/, per client IP and per email address.
+# CACHE_ALIAS must name a cache shared by all workers for RATE to hold overall;
+# with the per-process "default" (LocMem) each worker allows RATE on its own.
+# `manage.py check --deploy` warns about that (profiles_api.W001).
+LOGIN_THROTTLE = {
+    "CACHE_ALIAS": "default",
+    "ip": {"RATE": "30/min", "BURST": 10},
+    "email": {"RATE": "10/min", "BURST": 5},
+}
+
+# Cache of authenticated users (see profiles_api/principals.py). Each worker
+# keeps users for LOCAL_TTL seconds; the worker that changes a user drops it at
+# once, the others when it expires. Set BACKEND to a CACHES alias to share
+# entries and apply changes in every worker at once; a changed user is not
+# re-cached there for INVALIDATE_GRACE seconds. Local hits then cost one get
+# of the user's version, or none for VERSION_CHECK seconds after the last one.
+PRINCIPAL_CACHE = {
+    "TTL": 60,
+    "LOCAL_TTL": 5,
+    "MAX_SIZE": 1024,
+    "BACKEND": None,
+    "INVALIDATE_GRACE": 10,
+    "VERSION_CHECK": 0,
+}
+
+# Memo of already-verified bearer tokens; POLICY is "lru" or "fifo" and
+# MAX_SIZE 0 turns it off.
+JWT_TOKEN_MEMO = {
+    "MAX_SIZE": 4096,
+    "POLICY": "lru",
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),  # access token valid for 5 min
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),  # refresh token valid for 1 day
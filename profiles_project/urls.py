@@ -2,11 +2,15 @@
 URL configuration for profiles_project project.
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/", include("profiles_api.urls")),
+    path(
+        "api/",
+        include("profiles_api.async_urls" if settings.ASYNC_API else "profiles_api.urls"),
+    ),
 ]
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from profiles_api import sqlite_tuning
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "profiles_project.settings")
 
+sqlite_tuning.serve_persistent_pragmas()
 application = get_wsgi_application()